@@ -6,22 +6,28 @@ Access via the exported DadGuide sqlite database.
 Don't hold on to any of the dastructures exported from here, or the
 entire database could be leaked when the module is reloaded.
 """
+import aiohttp
 import asyncio
 import csv
 import difflib
-import json
 import logging
 import os
 import shutil
+import time
 import tsutils
 from io import BytesIO
 from collections import defaultdict
 from redbot.core import checks, data_manager
 from redbot.core import commands
+from redbot.core.utils.chat_formatting import box, pagify
 
 from .database_manager import *
 from .old_monster_index import MonsterIndex
-from .database_loader import load_database
+from .database_loader import prepare_working_file
+from .downloader import ConditionalDownloader
+from .json_export import write_json_object
+from .index_builder import build_index_snapshot, inputs_digest, load_index_snapshot, make_build_pool, \
+    read_snapshot_file
 
 from .models.monster_model import MonsterModel
 
@@ -48,9 +54,17 @@ try:
     NICKNAME_FILE_PATTERN = _data_file(CSV_FILE_PATTERN.format('nicknames'))
     BASENAME_FILE_PATTERN = _data_file(CSV_FILE_PATTERN.format('basenames'))
     PANTHNAME_FILE_PATTERN = _data_file(CSV_FILE_PATTERN.format('panthnames'))
+    OVERRIDE_FILES = (NICKNAME_FILE_PATTERN, BASENAME_FILE_PATTERN, PANTHNAME_FILE_PATTERN)
 
     DB_DUMP_URL = 'https://d1kpnpud0qoyxf.cloudfront.net/db/dadguide.sqlite'
     DB_DUMP_FILE = _data_file('dadguide.sqlite')
+    # Downloads land here first and are then renamed over DB_DUMP_FILE
+    DB_DUMP_DOWNLOAD_FILE = _data_file('dadguide_download.sqlite')
+    # ETag and Last-Modified of the downloaded files
+    DOWNLOAD_STATE_FILE = _data_file('download_state.json')
+
+    # The last index built, with the digest of the dump and override files it was built from
+    INDEX_SNAPSHOT_FILE = _data_file('index_snapshot.pickle')
 except RuntimeError:
     pass
 
@@ -79,6 +93,13 @@ class Dadguide(commands.Cog):
         self.database = None
         self.index = None  # type: MonsterIndex
 
+        self.downloader = ConditionalDownloader(DOWNLOAD_STATE_FILE)
+
+        # Seconds spent in each phase of the last refresh
+        self.refresh_timings = {}
+        # Digest of the dump and override files the current index was built from
+        self._index_inputs = None
+
     async def wait_until_ready(self):
         """Wait until the Dadguide cog is ready.
 
@@ -123,9 +144,13 @@ class Dadguide(commands.Cog):
     async def reload_data_task(self):
         await self.bot.wait_until_ready()
 
-        # We already had a copy of the database at startup, signal that we're ready now.
-        if self.database and self.database.has_database():
-            logger.info('Using stored database at load')
+        # Serve the index saved by the last run while the first refresh checks for new data
+        try:
+            if await self._load_stored_index():
+                logger.info('Using stored index at load')
+                self._is_ready.set()
+        except Exception as ex:
+            logger.exception("stored dadguide index load failed: %s", ex)
 
         while self == self.bot.get_cog('Dadguide'):
             short_wait = False
@@ -153,15 +178,32 @@ class Dadguide(commands.Cog):
     async def download_and_refresh_nicknames(self):
         if self.settings.data_file():
             logger.info('Copying dg data file')
-            shutil.copy2(self.settings.data_file(), DB_DUMP_FILE)
+            shutil.copy2(self.settings.data_file(), DB_DUMP_DOWNLOAD_FILE)
+            add_dump_indexes(DB_DUMP_DOWNLOAD_FILE)
+            os.replace(DB_DUMP_DOWNLOAD_FILE, DB_DUMP_FILE)
+            logger.info('Downloading dg name override files')
         else:
-            logger.info('Downloading dg data files')
-            await self._download_files()
-
-        logger.info('Downloading dg name override files')
-        await self._download_override_files()
+            logger.info('Downloading dg data and name override files')
+        await self._download_files(download_dump=not self.settings.data_file())
 
         logger.info('Loading dg name overrides')
+        self._load_name_overrides()
+
+        inputs = await asyncio.get_running_loop().run_in_executor(
+            None, inputs_digest, (DB_DUMP_FILE,) + OVERRIDE_FILES)
+        if inputs == self._index_inputs:
+            logger.debug('dg data unchanged, keeping the current index')
+            return
+
+        logger.debug('Building dg graph and monster index')
+        await self._rebuild_index(prepare_working_file(self.database), inputs)
+
+        logger.debug('Writing dg monster computed names')
+        await asyncio.get_running_loop().run_in_executor(None, self.write_monster_computed_names)
+
+        logger.debug('Done refreshing dg data')
+
+    def _load_name_overrides(self):
         nickname_overrides = self._csv_to_tuples(NICKNAME_FILE_PATTERN)
         basename_overrides = self._csv_to_tuples(BASENAME_FILE_PATTERN)
         panthname_overrides = self._csv_to_tuples(PANTHNAME_FILE_PATTERN)
@@ -180,34 +222,90 @@ class Dadguide(commands.Cog):
         self.panthname_overrides = {x[0].lower(): x[1].lower() for x in panthname_overrides}
         self.panthname_overrides.update({v: v for _, v in self.panthname_overrides.items()})
 
-        logger.debug('Loading dg database')
-        self.database = load_database(self.database)
-        logger.debug('Building dg monster index')
-        self.index = await MonsterIndex(self.database, self.nickname_overrides,
-                                        self.basename_overrides, self.panthname_overrides)
-
-        logger.debug('Writing dg monster computed names')
-        self.write_monster_computed_names()
+    async def _load_stored_index(self):
+        """Load the index saved by the last refresh, if the files it was built from are unchanged.
 
-        logger.debug('Done refreshing dg data')
+        Returns whether an index was loaded.
+        """
+        loop = asyncio.get_running_loop()
+        stored = await loop.run_in_executor(None, read_snapshot_file, INDEX_SNAPSHOT_FILE)
+        if stored is None:
+            return False
+        input_files = (stored['data_file'],) + OVERRIDE_FILES
+        if not all(os.path.exists(f) for f in input_files):
+            return False
+        if await loop.run_in_executor(None, inputs_digest, input_files) != stored['inputs']:
+            return False
+
+        self._load_name_overrides()
+        index = load_index_snapshot(stored['snapshot'], DadguideDatabase(data_file=stored['data_file']))
+        self._swap_index(index, stored['inputs'])
+        return True
+
+    async def _rebuild_index(self, working_file: str, inputs: str):
+        """Build the graph and index for working_file in the worker, then swap them in.
+
+        The worker also saves the result to INDEX_SNAPSHOT_FILE for the next startup. It
+        only lives for one build, so it doesn't hold a second copy of the data between
+        refreshes.
+        """
+        loop = asyncio.get_running_loop()
+        timings = {}
+
+        start = time.perf_counter()
+        pool = make_build_pool()
+        try:
+            snapshot, build_timings = await loop.run_in_executor(
+                pool, build_index_snapshot, working_file,
+                self.nickname_overrides, self.basename_overrides, self.panthname_overrides,
+                INDEX_SNAPSHOT_FILE, inputs)
+        finally:
+            pool.shutdown(wait=False)
+        timings.update(build_timings)
+        timings['worker'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = load_index_snapshot(snapshot, DadguideDatabase(data_file=working_file))
+        timings['load'] = time.perf_counter() - start
+
+        self._swap_index(index, inputs)
+        self.refresh_timings = timings
+        logger.info('Rebuilt dg monster index: %s',
+                    ', '.join('{} {:.2f}s'.format(phase, secs) for phase, secs in timings.items()))
+
+    def _swap_index(self, index: MonsterIndex, inputs: str):
+        # Swap the database and index together, so lookups never pair one load's index
+        # with another load's database
+        old_database = self.database
+        self.database, self.index = index.db_context, index
+        self._index_inputs = inputs
+        if old_database:
+            old_database.close()
 
     def write_monster_computed_names(self):
-        results = {}
-        for name, nm in self.index.all_entries.items():
-            results[name] = int(tsutils.get_pdx_id_dadguide(nm))
+        index = self.index
+        # Most monsters have many names, so work out each one's PDX id once
+        pdx_ids = {}
 
-        with open(NAMES_EXPORT_PATH, 'w', encoding='utf-8') as f:
-            json.dump(results, f)
+        def pdx_id(nm):
+            if nm.monster_id not in pdx_ids:
+                pdx_ids[nm.monster_id] = int(tsutils.get_pdx_id_dadguide(nm))
+            return pdx_ids[nm.monster_id]
 
-        results = {}
-        for nm in self.index.all_monsters:
+        def basenames_entry(nm):
             entry = {'bn': list(nm.group_basenames)}
             if nm.extra_nicknames:
                 entry['nn'] = list(nm.extra_nicknames)
-            results[int(tsutils.get_pdx_id_dadguide(nm))] = entry
+            return entry
 
-        with open(BASENAMES_EXPORT_PATH, 'w', encoding='utf-8') as f:
-            json.dump(results, f)
+        if not write_json_object(
+                NAMES_EXPORT_PATH,
+                lambda: ((name, pdx_id(nm)) for name, nm in index.all_entries.items())):
+            logger.debug('Computed names unchanged')
+        if not write_json_object(
+                BASENAMES_EXPORT_PATH,
+                lambda: ((pdx_id(nm), basenames_entry(nm)) for nm in index.all_monsters)):
+            logger.debug('Base names unchanged')
 
     def _csv_to_tuples(self, file_path: str, cols: int = 2):
         # Loads a two-column CSV into an array of tuples.
@@ -228,24 +326,43 @@ class Dadguide(commands.Cog):
                 results.append(data)
         return results
 
-    async def _download_files(self):
+    async def _download_files(self, download_dump=True):
+        # Fetch everything at once over one session; each file is renamed into place
+        # only once it's complete
         one_hour_secs = 1 * 60 * 60
-        await tsutils.async_cached_dadguide_request(DB_DUMP_FILE, DB_DUMP_URL, one_hour_secs)
-
-    async def _download_override_files(self):
-        one_hour_secs = 1 * 60 * 60
-        await tsutils.async_cached_plain_request(
-            NICKNAME_FILE_PATTERN, NICKNAME_OVERRIDES_SHEET, one_hour_secs)
-        await tsutils.async_cached_plain_request(
-            BASENAME_FILE_PATTERN, GROUP_BASENAMES_OVERRIDES_SHEET, one_hour_secs)
-        await tsutils.async_cached_plain_request(
-            PANTHNAME_FILE_PATTERN, PANTHNAME_OVERRIDES_SHEET, one_hour_secs)
+        fetches = [
+            (NICKNAME_OVERRIDES_SHEET, NICKNAME_FILE_PATTERN, None, None),
+            (GROUP_BASENAMES_OVERRIDES_SHEET, BASENAME_FILE_PATTERN, None, None),
+            (PANTHNAME_OVERRIDES_SHEET, PANTHNAME_FILE_PATTERN, None, None),
+        ]
+        if download_dump:
+            fetches.append((DB_DUMP_URL, DB_DUMP_FILE, add_dump_indexes, DB_DUMP_DOWNLOAD_FILE))
+        async with aiohttp.ClientSession() as session:
+            results = await asyncio.gather(*[
+                self.downloader.fetch(session, url, file_path, one_hour_secs,
+                                      prepare=prepare, tmp_path=tmp_path)
+                for url, file_path, prepare, tmp_path in fetches], return_exceptions=True)
+        # Let every fetch finish before failing, so none is left writing its file
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
 
     @commands.group()
     @checks.is_owner()
     async def dadguide(self, ctx):
         """Dadguide database settings"""
 
+    @dadguide.command()
+    @checks.is_owner()
+    async def queryplans(self, ctx):
+        """Time the queries run on refresh and show their query plans."""
+        msg = ''
+        for name, secs, plan in self.database.explain_queries():
+            msg += '{} ({:.1f} ms)\n'.format(name, secs * 1000)
+            msg += ''.join('  {}\n'.format(step) for step in plan)
+        for page in pagify(msg):
+            await ctx.send(box(page))
+
     @dadguide.command()
     @checks.is_owner()
     async def setdatafile(self, ctx, *, data_file):
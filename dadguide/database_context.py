@@ -3,9 +3,10 @@ from collections import OrderedDict, defaultdict, deque
 from typing import Optional
 
 from .database_manager import DadguideDatabase
-from .monster_graph import MonsterGraph
+from .monster_graph import MonsterGraph, MONSTER_QUERY, EVOS_QUERY, AWAKENINGS_QUERY, EGG_QUERY
 from .models.scheduled_event_model import ScheduledEventModel
 from .models.dungeon_model import DungeonModel
+from .models.monster_model import MonsterModel
 
 SCHEDULED_EVENT_QUERY = """SELECT
   schedule.*,
@@ -16,17 +17,52 @@ SCHEDULED_EVENT_QUERY = """SELECT
 FROM
   schedule LEFT OUTER JOIN dungeons ON schedule.dungeon_id = dungeons.dungeon_id"""
 
+AWOKEN_SKILL_IDS_QUERY = 'SELECT awoken_skill_id from awoken_skills'
+
+ALL_MONSTER_IDS_QUERY = DadguideDatabase.select_builder(tables={'monsters': ('monster_id',)})
+
+# Monsters nothing evolves into: evolution roots, plus monsters with no evolutions at all.
+# NOT EXISTS lets sqlite probe the evolutions indexes instead of building NOT IN lists
+BASE_MONSTER_IDS_QUERY = '''
+    SELECT evolutions.from_id AS monster_id FROM evolutions
+    WHERE NOT EXISTS (SELECT 1 FROM evolutions AS prev WHERE prev.to_id = evolutions.from_id)
+    UNION
+    SELECT monsters.monster_id FROM monsters
+    WHERE NOT EXISTS (SELECT 1 FROM evolutions WHERE evolutions.from_id = monsters.monster_id)
+      AND NOT EXISTS (SELECT 1 FROM evolutions WHERE evolutions.to_id = monsters.monster_id)'''
+
+# Every query run against the dump when it's loaded, for explain_queries
+REFRESH_QUERIES = OrderedDict([
+    ('monsters', MONSTER_QUERY),
+    ('evolutions', EVOS_QUERY),
+    ('awakenings', AWAKENINGS_QUERY),
+    ('eggs', EGG_QUERY),
+    ('all_monster_ids', ALL_MONSTER_IDS_QUERY),
+    ('base_monster_ids', BASE_MONSTER_IDS_QUERY),
+    ('awoken_skill_ids', AWOKEN_SKILL_IDS_QUERY),
+    ('scheduled_events', SCHEDULED_EVENT_QUERY),
+])
+
 
 class DbContext(object):
     def __init__(self, database: DadguideDatabase, graph: MonsterGraph):
         self.database = database
         self.graph = graph
 
+    def __getstate__(self):
+        # The database handle can't cross processes; attach() a new one after unpickling
+        state = self.__dict__.copy()
+        state['database'] = None
+        return state
+
+    def attach(self, database: DadguideDatabase):
+        self.database = database
+        self.graph.database = database
+
     def get_awoken_skill_ids(self):
-        SELECT_AWOKEN_SKILL_IDS = 'SELECT awoken_skill_id from awoken_skills'
         return [r.awoken_skill_id for r in
                 self.database.query_many(
-                    SELECT_AWOKEN_SKILL_IDS, (), as_generator=True)]
+                    AWOKEN_SKILL_IDS_QUERY, (), as_generator=True)]
 
     def get_next_evolutions_by_monster(self, monster_id):
         return self.graph.get_next_evolutions_by_monster_id(monster_id)
@@ -59,9 +95,7 @@ class DbContext(object):
         return self.get_monsters_where(lambda m: m.active_skill_id == active_skill_id)
 
     def get_all_monster_ids_query(self, as_generator=True):
-        query = self.database.query_many(
-            self.database.select_builder(tables={'monsters': ('monster_id',)}), (),
-            as_generator=as_generator)
+        query = self.database.query_many(ALL_MONSTER_IDS_QUERY, (), as_generator=as_generator)
         if as_generator:
             return map(lambda m: m.monster_id, query)
         return [m.monster_id for m in query]
@@ -72,6 +106,10 @@ class DbContext(object):
             return [*monsters]
         return monsters
 
+    def get_monster_stats(self, monsters, lv=99, plus=0, inherit=False):
+        """MonsterModel.stats for many monsters at once, as numpy arrays (hp, atk, rcv, weighted)."""
+        return MonsterModel.stats_many(monsters, lv, plus, inherit)
+
     def get_all_events(self) -> ScheduledEventModel:
         result = self.database.query_many(SCHEDULED_EVENT_QUERY, ())
         for se in result:
@@ -82,15 +120,17 @@ class DbContext(object):
             yield ScheduledEventModel(**se)
 
     def get_base_monster_ids(self):
-        SELECT_BASE_MONSTER_ID = '''
-            SELECT evolutions.from_id as monster_id FROM evolutions WHERE evolutions.from_id NOT IN (SELECT DISTINCT evolutions.to_id FROM evolutions)
-            UNION
-            SELECT monsters.monster_id FROM monsters WHERE monsters.monster_id NOT IN (SELECT evolutions.from_id FROM evolutions UNION SELECT evolutions.to_id FROM evolutions)'''
         return self.database.query_many(
-            SELECT_BASE_MONSTER_ID,
+            BASE_MONSTER_IDS_QUERY,
             (),
             as_generator=True)
 
+    def explain_queries(self):
+        """(name, seconds, plan) for each of REFRESH_QUERIES, slowest first."""
+        results = [(name, self.database.time_query(query, ()), self.database.explain(query, ()))
+                   for name, query in REFRESH_QUERIES.items()]
+        return sorted(results, key=lambda r: r[1], reverse=True)
+
     def has_database(self):
         return self.database.has_database()
 
@@ -3,26 +3,44 @@ import os
 
 from redbot.core import data_manager
 
-from .database_manager import DadguideDatabase
-from .database_context import DbContext
-from .monster_graph import MonsterGraph
+# The live database reads one of these while the next load is swapped into the other
+DB_DUMP_WORKING_FILES = ('dadguide_working.sqlite', 'dadguide_working_b.sqlite')
 
 
 def _data_file(file_name: str) -> str:
     return os.path.join(str(data_manager.cog_data_path(raw_name='dadguide')), file_name)
 
 
-def load_database(existing_db):
+def replace_file(source_path: str, dest_path: str):
+    """Atomically make dest_path a copy of source_path.
+
+    source_path is hard linked into place when the filesystem allows it, so no data is
+    copied; this relies on source_path itself only ever being replaced, never rewritten.
+    Anyone holding dest_path open keeps reading the file they opened.
+    """
+    tmp_path = dest_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        shutil.copy2(source_path, tmp_path)
+    os.replace(tmp_path, dest_path)
+
+
+def prepare_working_file(existing_db) -> str:
+    """Swap the latest dump into a working copy that existing_db isn't reading.
+
+    There are two working copies, used alternately, so the live database keeps reading its
+    own copy while the next one is loaded. Returns the path of the copy to load.
+    """
     DB_DUMP_FILE = _data_file('dadguide.sqlite')
-    DB_DUMP_WORKING_FILE = _data_file('dadguide_working.sqlite')
-    # Release the handle to the database file if it has one
-    if existing_db:
-        existing_db.close()
-    # Overwrite the working copy so we can open a handle to it without affecting future downloads
-    if os.path.exists(DB_DUMP_FILE):
-        shutil.copy2(DB_DUMP_FILE, DB_DUMP_WORKING_FILE)
-    # Open the new working copy.
-    database = DadguideDatabase(data_file=DB_DUMP_WORKING_FILE)
-    graph = MonsterGraph(database)
-    db_context = DbContext(database, graph)
-    return db_context
+    in_use = existing_db.database.data_file if existing_db and existing_db.database else None
+    working_file = next(f for f in map(_data_file, DB_DUMP_WORKING_FILES) if f != in_use)
+    if not os.path.exists(DB_DUMP_FILE):
+        # Nothing new to load; reopen the copy we have
+        return in_use or working_file
+    # Future downloads replace the dump rather than writing into it, so the working copy
+    # can be a link to it
+    replace_file(DB_DUMP_FILE, working_file)
+    return working_file
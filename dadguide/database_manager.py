@@ -1,9 +1,43 @@
 import sqlite3 as lite
 
 import logging
+import pathlib
+import time
 
 logger = logging.getLogger('red.padbot-cogs.dadguide.database_manager')
 
+# Rows fetched from sqlite at a time when streaming a query
+QUERY_BATCH_SIZE = 500
+
+# The dump is only ever read, so map it into memory and keep a generous page cache
+READ_ONLY_PRAGMAS = (
+    'PRAGMA query_only = ON',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536',
+)
+
+
+# Indexes the dump ships without; added to each new dump before it's swapped in, since the
+# working copy is opened read only
+DUMP_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS evolutions_from_id_to_id ON evolutions (from_id, to_id)',
+    'CREATE INDEX IF NOT EXISTS evolutions_to_id_from_id ON evolutions (to_id, from_id)',
+)
+
+
+def add_dump_indexes(data_file):
+    con = lite.connect(data_file)
+    try:
+        with con:
+            for statement in DUMP_INDEXES:
+                con.execute(statement)
+    except lite.Error as ex:
+        # The queries work without them, just slower
+        logger.warning('Failed to index %s: %s', data_file, ex)
+    finally:
+        con.close()
+
 
 class DadguideTableNotFound(Exception):
     def __init__(self, table_name):
@@ -12,8 +46,11 @@ class DadguideTableNotFound(Exception):
 
 class DadguideDatabase(object):
     def __init__(self, data_file):
-        self._con = lite.connect(data_file, detect_types=lite.PARSE_DECLTYPES)
-        self._con.row_factory = lite.Row
+        self.data_file = data_file
+        uri = pathlib.Path(data_file).absolute().as_uri() + '?mode=ro'
+        self._con = lite.connect(uri, uri=True, detect_types=lite.PARSE_DECLTYPES)
+        for pragma in READ_ONLY_PRAGMAS:
+            self._con.execute(pragma)
 
     def __del__(self):
         self.close()
@@ -60,20 +97,28 @@ class DadguideDatabase(object):
             query.append(ORDER.format(order=order))
         return ' '.join(query)
 
+    @staticmethod
+    def _column_names(cursor):
+        return [d[0] for d in cursor.description]
+
     def query_one(self, query, param):
         cursor = self._con.cursor()
         cursor.execute(query, param)
         res = cursor.fetchone()
         if res is not None:
-            return DictWithAttrAccess(res)
+            return DictWithAttrAccess(zip(self._column_names(cursor), res))
         return None
 
-    @staticmethod
-    def as_generator(cursor):
-        res = cursor.fetchone()
-        while res is not None:
-            yield DictWithAttrAccess(res)
-            res = cursor.fetchone()
+    @classmethod
+    def as_generator(cls, cursor):
+        # Rows come back from sqlite as plain tuples; the column names are looked up once
+        # per query and each row becomes a single DictWithAttrAccess
+        names = cls._column_names(cursor)
+        batch = cursor.fetchmany(QUERY_BATCH_SIZE)
+        while batch:
+            for res in batch:
+                yield DictWithAttrAccess(zip(names, res))
+            batch = cursor.fetchmany(QUERY_BATCH_SIZE)
 
     def query_many(self, query, param, idx_key=None, as_generator=False):
         cursor = self._con.cursor()
@@ -81,13 +126,27 @@ class DadguideDatabase(object):
         if cursor.rowcount == 0:
             return []
         if as_generator:
-            return (DictWithAttrAccess(res)
-                    for res in cursor.fetchall())
+            return self.as_generator(cursor)
+        names = self._column_names(cursor)
+        rows = [DictWithAttrAccess(zip(names, res)) for res in cursor.fetchall()]
+        if idx_key is None:
+            return rows
         else:
-            if idx_key is None:
-                return [DictWithAttrAccess(res) for res in cursor.fetchall()]
-            else:
-                return DictWithAttrAccess({res[idx_key]: DictWithAttrAccess(res) for res in cursor.fetchall()})
+            return DictWithAttrAccess({row[idx_key]: row for row in rows})
+
+    def explain(self, query, param):
+        """The query's plan from EXPLAIN QUERY PLAN, one detail string per step."""
+        cursor = self._con.cursor()
+        cursor.execute('EXPLAIN QUERY PLAN ' + query, param)
+        return [row[-1] for row in cursor.fetchall()]
+
+    def time_query(self, query, param):
+        """Seconds taken to run the query and fetch every row."""
+        start = time.perf_counter()
+        cursor = self._con.cursor()
+        cursor.execute(query, param)
+        cursor.fetchall()
+        return time.perf_counter() - start
 
     def get_table_fields(self, table_name: str):
         # SQL inject vulnerable :v
@@ -104,6 +163,14 @@ class DadguideDatabase(object):
 
 
 class DictWithAttrAccess(dict):
-    def __init__(self, item):
-        super(DictWithAttrAccess, self).__init__(item)
-        self.__dict__ = self
+    """A dict whose keys can also be read and written as attributes."""
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import aiohttp
+
+logger = logging.getLogger('red.padbot-cogs.dadguide.downloader')
+
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+
+
+class ConditionalDownloader(object):
+    """Downloads files to disk with conditional requests.
+
+    The ETag and Last-Modified of every file downloaded are kept in a JSON file at
+    state_file, and sent back as If-None-Match/If-Modified-Since the next time the file is
+    fetched, so the server can answer 304 instead of resending a file that didn't change.
+    """
+
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        self.validators = {}
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, encoding='utf-8') as f:
+                    self.validators = json.load(f)
+            except ValueError:
+                logger.warning('Ignoring malformed download state %s', state_file)
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str, file_path: str,
+                    expiry_secs: int, prepare=None, tmp_path: str = None) -> bool:
+        """Bring file_path up to date with url, unless it's younger than expiry_secs.
+
+        A new file is written to tmp_path (file_path + '.download' by default), passed to
+        prepare if given, which runs in a thread, and then renamed over file_path, so
+        file_path is never half written; tmp_path is removed if that fails. Returns whether
+        a new file was downloaded.
+        """
+        if os.path.exists(file_path) and time.time() - os.path.getmtime(file_path) < expiry_secs:
+            return False
+
+        headers = {}
+        validators = self.validators.get(url, {})
+        if os.path.exists(file_path):
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        tmp_path = tmp_path or file_path + '.download'
+        async with session.get(url, headers=headers) as resp:
+            if resp.status == 304:
+                # Unchanged; restart the expiry clock
+                os.utime(file_path)
+                return False
+            resp.raise_for_status()
+            validators = {
+                'etag': resp.headers.get('ETag'),
+                'last_modified': resp.headers.get('Last-Modified'),
+            }
+            try:
+                with open(tmp_path, 'wb') as f:
+                    async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                        f.write(chunk)
+                if prepare:
+                    await asyncio.get_running_loop().run_in_executor(None, prepare, tmp_path)
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                # Don't leave a partial download behind
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        self.validators[url] = validators
+        self._save()
+        return True
+
+    def _save(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.validators, f)
+        os.replace(tmp_file, self.state_file)
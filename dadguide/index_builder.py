@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import site
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .database_manager import DadguideDatabase
+from .database_context import DbContext
+from .monster_graph import MonsterGraph
+from .old_monster_index import MonsterIndex
+
+logger = logging.getLogger('red.padbot-cogs.dadguide.index_builder')
+
+# Bump whenever a change to the graph, index or models makes old snapshots unloadable
+SNAPSHOT_VERSION = 2
+
+
+def make_build_pool() -> ProcessPoolExecutor:
+    """A single worker process to run build_index_snapshot in.
+
+    The worker is spawned rather than forked, since forking the running bot copies its
+    event loop, sockets and threads into the child, which can deadlock. A spawned worker
+    imports this cog afresh, so the directory the cog was loaded from is added to the
+    worker's sys.path; the bot's own sys.path is left alone.
+    """
+    cogs_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # The initializer has to be importable before cogs_dir is on the path, so it's a
+    # stdlib function rather than one from this cog
+    return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=site.addsitedir, initargs=(cogs_dir,))
+
+
+def build_index_snapshot(data_file: str, nickname_overrides, basename_overrides,
+                         panthname_overrides, snapshot_file: str = None, inputs: str = None):
+    """Build the monster graph and index for data_file and pickle them.
+
+    Runs in a worker process from make_build_pool, so the build doesn't hold the bot's
+    event loop. Returns the
+    pickled MonsterIndex, whose db_context carries the graph but no database handle; call
+    DbContext.attach in the loading process before using it. Also returns the seconds
+    spent in each phase of the build.
+
+    If snapshot_file is given, the snapshot is also saved there, keyed by inputs.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    database = DadguideDatabase(data_file=data_file)
+    graph = MonsterGraph(database)
+    db_context = DbContext(database, graph)
+    timings['graph'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = asyncio.run(_build_index(db_context, nickname_overrides, basename_overrides,
+                                     panthname_overrides))
+    timings['index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    database.close()
+    snapshot = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+    timings['serialize'] = time.perf_counter() - start
+
+    if snapshot_file:
+        start = time.perf_counter()
+        write_snapshot_file(snapshot_file, inputs, data_file, snapshot)
+        timings['persist'] = time.perf_counter() - start
+
+    return snapshot, timings
+
+
+async def _build_index(db_context, nickname_overrides, basename_overrides, panthname_overrides):
+    return await MonsterIndex(db_context, nickname_overrides, basename_overrides,
+                              panthname_overrides)
+
+
+def load_index_snapshot(snapshot: bytes, database: DadguideDatabase) -> MonsterIndex:
+    """Unpickle a snapshot from build_index_snapshot and attach it to database."""
+    index = pickle.loads(snapshot)
+    index.db_context.attach(database)
+    return index
+
+
+def inputs_digest(file_paths) -> str:
+    """A hash of the contents of file_paths, identifying what an index was built from."""
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        file_digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                file_digest.update(chunk)
+        digest.update(file_digest.digest())
+    return digest.hexdigest()
+
+
+def write_snapshot_file(snapshot_file: str, inputs: str, data_file: str, snapshot: bytes):
+    """Save a snapshot from build_index_snapshot, replacing any older one atomically."""
+    tmp_file = snapshot_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({
+            'version': SNAPSHOT_VERSION,
+            'inputs': inputs,
+            'data_file': data_file,
+            'snapshot': snapshot,
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, snapshot_file)
+
+
+def read_snapshot_file(snapshot_file: str):
+    """The saved snapshot as a dict of version, inputs, data_file and snapshot.
+
+    Returns None if there's no snapshot from this SNAPSHOT_VERSION.
+    """
+    if not os.path.exists(snapshot_file):
+        return None
+    try:
+        with open(snapshot_file, 'rb') as f:
+            stored = pickle.load(f)
+    except Exception as ex:
+        logger.warning('Ignoring unreadable index snapshot %s: %s', snapshot_file, ex)
+        return None
+    if stored.get('version') != SNAPSHOT_VERSION:
+        return None
+    return stored
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+
+# Entries encoded per write
+WRITE_BATCH_ENTRIES = 1000
+
+
+def _encoded_batches(items):
+    # The text json.dump would write for a dict of items, a batch of entries at a time
+    encode = json.JSONEncoder().encode
+    yield '{'
+    batch = []
+    separator = ''
+    for key, value in items:
+        if not isinstance(key, str):
+            key = str(key)
+        batch.append(separator + encode(key) + ': ' + encode(value))
+        separator = ', '
+        if len(batch) >= WRITE_BATCH_ENTRIES:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch) + '}'
+
+
+def _read_digest(digest_path: str):
+    if not os.path.exists(digest_path):
+        return None
+    with open(digest_path, encoding='ascii') as f:
+        return f.read().strip()
+
+
+def write_json_object(file_path: str, make_items) -> bool:
+    """Write (key, value) pairs to file_path as a JSON object, the same as json.dump would.
+
+    make_items returns an iterable of the pairs, which are encoded in batches rather than
+    collected into a dict first. It's called once to hash the output, which is compared
+    with the hash of the last write kept next to file_path, and again to write the file
+    only if that changed. The file is written to a temp file and renamed over file_path,
+    so readers never see a partial file. Returns whether file_path changed.
+    """
+    digest = hashlib.sha256()
+    for text in _encoded_batches(make_items()):
+        # ensure_ascii is on, so the output is plain ASCII
+        digest.update(text.encode('ascii'))
+    digest = digest.hexdigest()
+    digest_path = file_path + '.sha256'
+    if os.path.exists(file_path) and _read_digest(digest_path) == digest:
+        return False
+
+    tmp_path = file_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for text in _encoded_batches(make_items()):
+                f.write(text.encode('ascii'))
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    with open(digest_path, 'w', encoding='ascii') as f:
+        f.write(digest)
+    return True
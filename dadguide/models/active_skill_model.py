@@ -2,6 +2,9 @@ from .base_model import BaseModel
 
 
 class ActiveSkillModel(BaseModel):
+    __slots__ = ('active_skill_id', 'name_ja', 'name_en', 'name_ko', 'desc_ja', 'desc_en',
+                 'desc_ko', 'turn_max', 'turn_min')
+
     def __init__(self, **kwargs):
         self.active_skill_id = kwargs['active_skill_id']
         self.name_ja = kwargs['name_ja']
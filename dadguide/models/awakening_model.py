@@ -6,6 +6,8 @@ class AwakeningModel(BaseModel):
     """
     This class represents an awakening belonging to a monster, in contrast to AwokenSkillModel, which represents an "abstract" awoken skill.
     """
+    __slots__ = ('awakening_id', 'monster_id', 'awoken_skill_id', 'is_super', 'order_idx',
+                 'awoken_skill', 'name')
 
     def __init__(self, awoken_skill_model: AwokenSkillModel = None, **kwargs):
         self.awakening_id = kwargs['awakening_id']
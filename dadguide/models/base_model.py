@@ -2,6 +2,8 @@ import json
 
 
 class BaseModel(object):
+    # Empty so that subclasses declaring __slots__ don't get a __dict__ anyway
+    __slots__ = ()
 
     def to_dict(self):
         raise NotImplementedError
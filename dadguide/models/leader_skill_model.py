@@ -2,6 +2,10 @@ from .base_model import BaseModel
 
 
 class LeaderSkillModel(BaseModel):
+    __slots__ = ('leader_skill_id', 'name_ja', 'name_en', 'name_ko', 'max_hp', 'max_atk', 'max_rcv',
+                 'max_shield', 'max_combos', 'bonus_damage', 'mult_bonus_damage', 'extra_time',
+                 'desc_en', 'desc_ja', 'desc_ko')
+
     def __init__(self, **kwargs):
         self.leader_skill_id = kwargs['leader_skill_id']
         self.name_ja = kwargs['name_ja']
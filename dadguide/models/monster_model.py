@@ -10,8 +10,28 @@ import re
 from collections import defaultdict
 import romkan
 
+STAT_PLUS_VALUES = {'hp': 10, 'atk': 5, 'rcv': 3}
+STAT_INHERIT_MULTS = {'hp': 0.10, 'atk': 0.05, 'rcv': 0.15}
+
+# stats() results are memoized for these levels and pluses, which are what the id menus and
+# search ask for
+STATS_MEMO_LEVELS = (99, 110)
+STATS_MEMO_PLUSES = (0, 297)
+
 
 class MonsterModel(BaseModel):
+    __slots__ = ('monster_id', 'monster_no', 'monster_no_jp', 'monster_no_na', 'monster_no_kr',
+                 'awakenings', 'superawakening_count', 'leader_skill', 'leader_skill_id',
+                 'active_skill', 'active_skill_id', 'series', 'series_id', 'name_ja', 'name_ko',
+                 'name_en', 'roma_subname', 'name_en_override', 'type1', 'type2', 'type3', 'types',
+                 'rarity', 'is_farmable', 'in_rem', 'in_pem', 'in_mpshop', 'buy_mp', 'sell_gold',
+                 'sell_mp', 'reg_date', 'on_jp', 'on_na', 'on_kr', 'attr1', 'attr2', 'is_equip',
+                 'is_inheritable', 'evo_gem_id', 'orb_skin_id', 'cost', 'exp', 'fodder_exp',
+                 'level', 'limit_mult', 'latent_slots', 'hp_max', 'hp_min', 'hp_scale', 'atk_max',
+                 'atk_min', 'atk_scale', 'rcv_max', 'rcv_min', 'rcv_scale', 'stat_values',
+                 'voice_id_jp', 'voice_id_na', 'pronunciation_ja', 'has_animation', 'has_hqimage',
+                 '_search', '_stats_memo')
+
     def __init__(self, **m):
         self.monster_id = m['monster_id']
         self.monster_no = self.monster_id
@@ -93,7 +113,17 @@ class MonsterModel(BaseModel):
         self.has_animation = m['has_animation']
         self.has_hqimage = m['has_hqimage']
 
-        self.search = MonsterSearchHelper(self)
+        self._search = None
+        # (lv, plus, inherit) -> stats() result, for the combinations in STATS_MEMO_LEVELS/PLUSES
+        self._stats_memo = {}
+
+    @property
+    def search(self) -> 'MonsterSearchHelper':
+        # Only padsearch reads these, so they're built on first use rather than for every
+        # monster at graph build time
+        if self._search is None:
+            self._search = MonsterSearchHelper(self)
+        return self._search
 
     @property
     def killers(self):
@@ -143,16 +173,25 @@ class MonsterModel(BaseModel):
             s_val = s_min
         if lv > 99:
             s_val *= 1 + (self.limit_mult / 11 * (lv - 99)) / 100
-        plus_dict = {'hp': 10, 'atk': 5, 'rcv': 3}
-        s_val += plus_dict[key] * max(min(plus, 99), 0)
+        s_val += STAT_PLUS_VALUES[key] * max(min(plus, 99), 0)
         if inherit:
-            inherit_dict = {'hp': 0.10, 'atk': 0.05, 'rcv': 0.15}
             if not is_plus_297:
-                s_val -= plus_dict[key] * max(min(plus, 99), 0)
-            s_val *= inherit_dict[key]
+                s_val -= STAT_PLUS_VALUES[key] * max(min(plus, 99), 0)
+            s_val *= STAT_INHERIT_MULTS[key]
         return int(round(s_val))
 
     def stats(self, lv=99, plus=0, inherit=False):
+        memo_key = None
+        if lv in STATS_MEMO_LEVELS and plus in STATS_MEMO_PLUSES:
+            memo_key = (lv, plus, inherit)
+            if memo_key in self._stats_memo:
+                return self._stats_memo[memo_key]
+        result = self._compute_stats(lv, plus, inherit)
+        if memo_key is not None:
+            self._stats_memo[memo_key] = result
+        return result
+
+    def _compute_stats(self, lv, plus, inherit):
         is_plus_297 = False
         if plus == 297:
             plus = (99, 99, 99)
@@ -165,6 +204,53 @@ class MonsterModel(BaseModel):
         weighted = int(round(hp / 10 + atk / 5 + rcv / 3))
         return hp, atk, rcv, weighted
 
+    @staticmethod
+    def stats_many(monsters, lv=99, plus=0, inherit=False):
+        """stats() for many monsters at once, as numpy arrays.
+
+        Returns int64 arrays (hp, atk, rcv, weighted) with one element per monster, each
+        equal to what stats() returns for it. The curve exponent goes through Python's pow
+        rather than numpy's, whose SIMD implementations can differ in the last bit.
+        """
+        import numpy as np
+
+        is_plus_297 = False
+        if plus == 297:
+            plus = (99, 99, 99)
+            is_plus_297 = True
+        elif plus == 0:
+            plus = (0, 0, 0)
+
+        level = np.array([m.level for m in monsters], dtype=np.int64)
+        scaled = level > 1
+        progress = np.zeros(len(monsters), dtype=np.float64)
+        progress[scaled] = (np.minimum(lv, level[scaled]) - 1) / (level[scaled] - 1)
+        if lv > 99:
+            limit_mult = np.array([m.limit_mult for m in monsters], dtype=np.float64)
+            limit_break = 1 + (limit_mult / 11 * (lv - 99)) / 100
+
+        stats = []
+        for key, key_plus in zip(('hp', 'atk', 'rcv'), plus):
+            s_min = np.array([float(m.stat_values[key]['min']) for m in monsters], dtype=np.float64)
+            s_max = np.array([float(m.stat_values[key]['max']) for m in monsters], dtype=np.float64)
+            curve = np.array([p ** m.stat_values[key]['scale'] if s else 0.
+                              for m, p, s in zip(monsters, progress.tolist(), scaled.tolist())],
+                             dtype=np.float64)
+            s_val = np.where(scaled, s_min + (s_max - s_min) * curve, s_min)
+            if lv > 99:
+                s_val *= limit_break
+            s_val += STAT_PLUS_VALUES[key] * max(min(key_plus, 99), 0)
+            if inherit:
+                if not is_plus_297:
+                    s_val -= STAT_PLUS_VALUES[key] * max(min(key_plus, 99), 0)
+                s_val *= STAT_INHERIT_MULTS[key]
+            # np.rint rounds half to even, like round()
+            stats.append(np.rint(s_val).astype(np.int64))
+
+        hp, atk, rcv = stats
+        weighted = np.rint(hp / 10 + atk / 5 + rcv / 3).astype(np.int64)
+        return hp, atk, rcv, weighted
+
     @staticmethod
     def make_roma_subname(name_ja):
         subname = re.sub(r'[＝]', '', name_ja)
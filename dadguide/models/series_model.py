@@ -2,6 +2,8 @@ from .base_model import BaseModel
 
 
 class SeriesModel(BaseModel):
+    __slots__ = ('series_id', 'name_ja', 'name_en', 'name_ko')
+
     def __init__(self, **kwargs):
         self.series_id = kwargs['series_id']
         self.name_ja = kwargs['name_ja']
@@ -1,4 +1,3 @@
-import networkx
 import json
 from typing import Optional
 from collections import defaultdict
@@ -82,6 +81,8 @@ FROM
   awakenings
   JOIN awoken_skills ON awakenings.awoken_skill_id = awoken_skills.awoken_skill_id"""
 
+EDGE_TYPES = ('evolution', 'back_evolution', 'transformation', 'back_transformation', 'material_of')
+
 EGG_QUERY = """SELECT
    d_egg_machine_types.name AS type,
    egg_machines.*
@@ -94,26 +95,43 @@ FROM
 class MonsterGraph(object):
     def __init__(self, database: DadguideDatabase):
         self.database = database
-        self.graph = None
-        self.graph: networkx.MultiDiGraph
-        self.edges = None
-        self.nodes = None
         self.max_monster_id = -1
+
+        # monster_id -> MonsterModel
+        self._monsters = {}
+        # edge type -> monster_id -> frozenset of neighbor monster_ids
+        self._adjacency = {etype: {} for etype in EDGE_TYPES}
+        # to_id -> most recent EvolutionModel producing it
+        self._evo_models = {}
+
+        # monster_id -> component index, and component index -> sorted member ids
+        self._alt_component_ids = {}
+        self._alt_components = []
+        self._evo_component_ids = {}
+        self._evo_components = []
+        self._transform_component_ids = {}
+        self._transform_components = []
         self.build_graph()
 
+    def __getstate__(self):
+        # The database is only read while building; DbContext.attach restores it
+        state = self.__dict__.copy()
+        state['database'] = None
+        return state
+
     def build_graph(self):
-        self.graph = networkx.MultiDiGraph()
+        self._monsters = {}
+        self._evo_models = {}
+        adjacency = {etype: defaultdict(set) for etype in EDGE_TYPES}
 
         ms = self.database.query_many(MONSTER_QUERY, ())
         es = self.database.query_many(EVOS_QUERY, ())
         aws = self.database.query_many(AWAKENINGS_QUERY, ())
         ems = self.database.query_many(EGG_QUERY, ())
 
-        mtoawo = defaultdict(list)
+        mtoaws = defaultdict(list)
         for a in aws:
-            awoken_skill_model = AwokenSkillModel(**a)
-            awakening_model = AwakeningModel(awoken_skill_model=awoken_skill_model, **a)
-            mtoawo[a.monster_id].append(awakening_model)
+            mtoaws[a.monster_id].append(a)
 
         mtoegg = defaultdict(lambda: {'pem': False, 'rem': False})
         for e in ems:
@@ -123,7 +141,54 @@ class MonsterGraph(object):
                 idx = int(m[1:-1])  # Remove parentheses
                 mtoegg[idx][e_type] = True
 
+        # Skill and series models shared by many monsters are built once per id
+        interned = {'awoken_skill': {}, 'leader_skill': {}, 'active_skill': {}, 'series': {}}
         for m in ms:
+            m_model = self._make_monster_model(m, mtoaws[m.monster_id], mtoegg[m.monster_id],
+                                               interned)
+
+            self._monsters[m.monster_id] = m_model
+            if m.linked_monster_id:
+                adjacency['transformation'][m.monster_id].add(m.linked_monster_id)
+                adjacency['back_transformation'][m.linked_monster_id].add(m.monster_id)
+
+            self.max_monster_id = max(self.max_monster_id, m.monster_id)
+
+        for e in es:
+            evo_model = EvolutionModel(**e)
+
+            adjacency['evolution'][evo_model.from_id].add(evo_model.to_id)
+            adjacency['back_evolution'][evo_model.to_id].add(evo_model.from_id)
+            prev_evo = self._evo_models.get(evo_model.to_id)
+            if prev_evo is None or prev_evo.tstamp <= evo_model.tstamp:
+                self._evo_models[evo_model.to_id] = evo_model
+
+            # for material_of queries
+            for mat in evo_model.mats:
+                adjacency['material_of'][mat].add(evo_model.to_id)
+
+        self._adjacency = {etype: {mid: frozenset(ids) for mid, ids in edges.items()}
+                           for etype, edges in adjacency.items()}
+
+        self._alt_component_ids, self._alt_components = self._build_components(
+            {'evolution', 'back_evolution', 'transformation', 'back_transformation'})
+        self._evo_component_ids, self._evo_components = self._build_components(
+            {'evolution', 'back_evolution'})
+        self._transform_component_ids, self._transform_components = self._build_components(
+            {'transformation', 'back_transformation'})
+
+    @staticmethod
+    def _make_monster_model(m, awakening_rows, eggs, interned) -> MonsterModel:
+        awakenings = []
+        for a in awakening_rows:
+            awoken_skill_model = interned['awoken_skill'].get(a.awoken_skill_id)
+            if awoken_skill_model is None:
+                awoken_skill_model = AwokenSkillModel(**a)
+                interned['awoken_skill'][a.awoken_skill_id] = awoken_skill_model
+            awakenings.append(AwakeningModel(awoken_skill_model=awoken_skill_model, **a))
+
+        ls_model = interned['leader_skill'].get(m.leader_skill_id)
+        if ls_model is None and m.leader_skill_id != 0:
             ls_model = LeaderSkillModel(leader_skill_id=m.leader_skill_id,
                                         name_ja=m.ls_name_ja,
                                         name_en=m.ls_name_en,
@@ -139,8 +204,11 @@ class MonsterGraph(object):
                                         bonus_damage=m.bonus_damage,
                                         mult_bonus_damage=m.mult_bonus_damage,
                                         extra_time=m.extra_time,
-                                        ) if m.leader_skill_id != 0 else None
+                                        )
+            interned['leader_skill'][m.leader_skill_id] = ls_model
 
+        as_model = interned['active_skill'].get(m.active_skill_id)
+        if as_model is None and m.active_skill_id != 0:
             as_model = ActiveSkillModel(active_skill_id=m.active_skill_id,
                                         name_ja=m.as_name_ja,
                                         name_en=m.as_name_en,
@@ -150,155 +218,140 @@ class MonsterGraph(object):
                                         desc_ko=m.as_desc_ko,
                                         turn_max=m.turn_max,
                                         turn_min=m.turn_min
-                                        ) if m.active_skill_id != 0 else None
+                                        )
+            interned['active_skill'][m.active_skill_id] = as_model
 
+        s_model = interned['series'].get(m.series_id)
+        if s_model is None:
             s_model = SeriesModel(series_id=m.series_id,
                                   name_ja=m.s_name_ja,
                                   name_en=m.s_name_en,
                                   name_ko=m.s_name_ko
                                   )
-
-            m_model = MonsterModel(monster_id=m.monster_id,
-                                   monster_no_jp=m.monster_no_jp,
-                                   monster_no_na=m.monster_no_na,
-                                   monster_no_kr=m.monster_no_kr,
-                                   awakenings=mtoawo[m.monster_id],
-                                   leader_skill=ls_model,
-                                   active_skill=as_model,
-                                   series=s_model,
-                                   series_id=m.series_id,
-                                   attribute_1_id=m.attribute_1_id,
-                                   attribute_2_id=m.attribute_2_id,
-                                   name_ja=m.name_ja,
-                                   name_en=m.name_en,
-                                   name_ko=m.name_ko,
-                                   name_en_override=m.name_en_override,
-                                   rarity=m.rarity,
-                                   is_farmable=m.drop_id is not None,
-                                   in_pem=mtoegg[m.monster_id]['pem'],
-                                   in_rem=mtoegg[m.monster_id]['rem'],
-                                   buy_mp=m.buy_mp,
-                                   sell_mp=m.sell_mp,
-                                   sell_gold=m.sell_gold,
-                                   reg_date=m.reg_date,
-                                   on_jp=m.on_jp == 1,
-                                   on_na=m.on_na == 1,
-                                   on_kr=m.on_kr == 1,
-                                   type_1_id=m.type_1_id,
-                                   type_2_id=m.type_2_id,
-                                   type_3_id=m.type_3_id,
-                                   is_inheritable=m.inheritable == 1,
-                                   evo_gem_id=m.evo_gem_id,
-                                   orb_skin_id=m.orb_skin_id,
-                                   cost=m.cost,
-                                   level=m.level,
-                                   exp=m.exp,
-                                   fodder_exp=m.fodder_exp,
-                                   limit_mult=m.limit_mult,
-                                   pronunciation_ja=m.pronunciation_ja,
-                                   voice_id_jp=m.voice_id_jp,
-                                   voice_id_na=m.voice_id_na,
-                                   hp_max=m.hp_max,
-                                   hp_min=m.hp_min,
-                                   hp_scale=m.hp_scale,
-                                   atk_max=m.atk_max,
-                                   atk_min=m.atk_min,
-                                   atk_scale=m.atk_scale,
-                                   rcv_max=m.rcv_max,
-                                   rcv_min=m.rcv_min,
-                                   rcv_scale=m.rcv_scale,
-                                   latent_slots=m.latent_slots,
-                                   has_animation=m.has_animation == 1,
-                                   has_hqimage=m.has_hqimage == 1,
-                                   )
-
-            self.graph.add_node(m.monster_id, model=m_model)
-            if m.linked_monster_id:
-                self.graph.add_edge(m.monster_id, m.linked_monster_id, type='transformation')
-                self.graph.add_edge(m.linked_monster_id, m.monster_id, type='back_transformation')
-
-            self.max_monster_id = max(self.max_monster_id, m.monster_id)
-
-        for e in es:
-            evo_model = EvolutionModel(**e)
-
-            self.graph.add_edge(
-                evo_model.from_id, evo_model.to_id, type='evolution', model=evo_model)
-            self.graph.add_edge(
-                evo_model.to_id, evo_model.from_id, type='back_evolution', model=evo_model)
-
-            # for material_of queries
-            already_used_in_this_evo = []  # don't add same mat more than once per evo
-            for mat in evo_model.mats:
-                if mat in already_used_in_this_evo:
-                    continue
-                self.graph.add_edge(
-                    mat, evo_model.to_id, type="material_of", model=evo_model)
-                already_used_in_this_evo.append(mat)
-
-        self.edges = self.graph.edges
-        self.nodes = self.graph.nodes
-
-    @staticmethod
-    def _get_edges(node, etype):
-        return {mid for mid, atlas in node.items() for edge in atlas.values() if edge.get('type') == etype}
-
-    @staticmethod
-    def _get_edge_model(node, etype):
-        possible_results = set()
-        for atlas in node.values():
-            for edge in atlas.values():
-                if edge.get('type') == etype:
-                    possible_results.add(edge['model'])
-        if len(possible_results) == 0:
-            return None
-        return sorted(possible_results, key=lambda x: x.tstamp)[-1]
+            interned['series'][m.series_id] = s_model
+
+        m_model = MonsterModel(monster_id=m.monster_id,
+                               monster_no_jp=m.monster_no_jp,
+                               monster_no_na=m.monster_no_na,
+                               monster_no_kr=m.monster_no_kr,
+                               awakenings=awakenings,
+                               leader_skill=ls_model,
+                               active_skill=as_model,
+                               series=s_model,
+                               series_id=m.series_id,
+                               attribute_1_id=m.attribute_1_id,
+                               attribute_2_id=m.attribute_2_id,
+                               name_ja=m.name_ja,
+                               name_en=m.name_en,
+                               name_ko=m.name_ko,
+                               name_en_override=m.name_en_override,
+                               rarity=m.rarity,
+                               is_farmable=m.drop_id is not None,
+                               in_pem=eggs['pem'],
+                               in_rem=eggs['rem'],
+                               buy_mp=m.buy_mp,
+                               sell_mp=m.sell_mp,
+                               sell_gold=m.sell_gold,
+                               reg_date=m.reg_date,
+                               on_jp=m.on_jp == 1,
+                               on_na=m.on_na == 1,
+                               on_kr=m.on_kr == 1,
+                               type_1_id=m.type_1_id,
+                               type_2_id=m.type_2_id,
+                               type_3_id=m.type_3_id,
+                               is_inheritable=m.inheritable == 1,
+                               evo_gem_id=m.evo_gem_id,
+                               orb_skin_id=m.orb_skin_id,
+                               cost=m.cost,
+                               level=m.level,
+                               exp=m.exp,
+                               fodder_exp=m.fodder_exp,
+                               limit_mult=m.limit_mult,
+                               pronunciation_ja=m.pronunciation_ja,
+                               voice_id_jp=m.voice_id_jp,
+                               voice_id_na=m.voice_id_na,
+                               hp_max=m.hp_max,
+                               hp_min=m.hp_min,
+                               hp_scale=m.hp_scale,
+                               atk_max=m.atk_max,
+                               atk_min=m.atk_min,
+                               atk_scale=m.atk_scale,
+                               rcv_max=m.rcv_max,
+                               rcv_min=m.rcv_min,
+                               rcv_scale=m.rcv_scale,
+                               latent_slots=m.latent_slots,
+                               has_animation=m.has_animation == 1,
+                               has_hqimage=m.has_hqimage == 1,
+                               )
+        return m_model
+
+    def _build_components(self, etypes):
+        """Union-find over the edges of the given types.
+
+        Returns a monster_id -> component index map, and a list of the sorted member ids
+        of each component, so tree queries don't need to walk the graph.
+        """
+        parent = {mid: mid for mid in self._monsters}
+        for edges in self._adjacency.values():
+            for mid, ids in edges.items():
+                parent.setdefault(mid, mid)
+                for other_id in ids:
+                    parent.setdefault(other_id, other_id)
+
+        def find(mid):
+            while parent[mid] != mid:
+                parent[mid] = parent[parent[mid]]
+                mid = parent[mid]
+            return mid
+
+        for etype in etypes:
+            for from_id, to_ids in self._adjacency[etype].items():
+                for to_id in to_ids:
+                    from_root, to_root = find(from_id), find(to_id)
+                    if from_root != to_root:
+                        parent[max(from_root, to_root)] = min(from_root, to_root)
+
+        root_to_members = defaultdict(list)
+        for mid in sorted(parent):
+            root_to_members[find(mid)].append(mid)
+
+        component_ids = {}
+        components = []
+        for idx, members in enumerate(root_to_members.values()):
+            components.append(tuple(members))
+            for mid in members:
+                component_ids[mid] = idx
+        return component_ids, components
+
+    def _get_edges(self, monster_id, etype) -> frozenset:
+        return self._adjacency[etype].get(monster_id, frozenset())
+
+    def to_networkx(self):
+        """Export the graph as a networkx MultiDiGraph, for debugging and analysis.
+
+        networkx is not needed for any lookups, so it's only imported here.
+        """
+        import networkx
+        graph = networkx.MultiDiGraph()
+        for monster_id, model in self._monsters.items():
+            graph.add_node(monster_id, model=model)
+        for etype, edges in self._adjacency.items():
+            for from_id, to_ids in edges.items():
+                for to_id in to_ids:
+                    graph.add_edge(from_id, to_id, type=etype)
+        return graph
 
     def get_monster(self, monster_id) -> Optional[MonsterModel]:
-        if monster_id not in self.graph.nodes:
-            return None
-        return self.graph.nodes[monster_id]['model']
+        return self._monsters.get(monster_id)
 
     def get_evo_tree(self, monster_id):
-        ids = set()
-        to_check = {monster_id}
-        while to_check:
-            mid = to_check.pop()
-            if mid in ids:
-                continue
-            n = self.graph[mid]
-            to_check.update(self._get_edges(n, 'evolution'))
-            to_check.update(self._get_edges(n, 'back_evolution'))
-            ids.add(mid)
-        return ids
+        return set(self._evo_components[self._evo_component_ids[monster_id]])
 
     def get_transform_tree(self, monster_id):
-        ids = set()
-        to_check = {monster_id}
-        while to_check:
-            mid = to_check.pop()
-            if mid in ids:
-                continue
-            n = self.graph[mid]
-            to_check.update(self._get_edges(n, 'transformation'))
-            to_check.update(self._get_edges(n, 'back_transformation'))
-            ids.add(mid)
-        return ids
+        return set(self._transform_components[self._transform_component_ids[monster_id]])
 
     def get_alt_cards(self, monster_id):
-        ids = set()
-        to_check = {monster_id}
-        while to_check:
-            mid = to_check.pop()
-            if mid in ids:
-                continue
-            n = self.graph[mid]
-            to_check.update(self._get_edges(n, 'evolution'))
-            to_check.update(self._get_edges(n, 'transformation'))
-            to_check.update(self._get_edges(n, 'back_evolution'))
-            to_check.update(self._get_edges(n, 'back_transformation'))
-            ids.add(mid)
-        return ids
+        return set(self._alt_components[self._alt_component_ids[monster_id]])
 
     def get_alt_monsters_by_id(self, monster_id):
         ids = self.get_alt_cards(monster_id)
@@ -308,10 +361,9 @@ class MonsterGraph(object):
         return self.get_alt_monsters_by_id(monster.monster_id)
 
     def get_base_id_by_id(self, monster_id):
-        alt_cards = self.get_alt_cards(monster_id)
-        if alt_cards is None:
+        if monster_id not in self._alt_component_ids:
             return None
-        return sorted(alt_cards)[0]
+        return self._alt_components[self._alt_component_ids[monster_id]][0]
 
     def get_base_monster_by_id(self, monster_id):
         return self.get_monster(self.get_base_id_by_id(monster_id))
@@ -336,7 +388,7 @@ class MonsterGraph(object):
             seen.add(curr)
             next_ids = self.get_prev_transforms_by_monster_id(monster_id)
             if next_ids:
-                curr = next_ids.pop()
+                curr = next(iter(next_ids))
             else:
                 break
         else:
@@ -353,16 +405,15 @@ class MonsterGraph(object):
         return self.monster_is_transform_base_by_id(monster.monster_no)
 
     def get_numerical_sort_top_id_by_id(self, monster_id):
-        alt_cards = self.get_alt_cards(monster_id)
-        if alt_cards is None:
+        if monster_id not in self._alt_component_ids:
             return None
-        return sorted(alt_cards)[-1]
+        return self._alt_components[self._alt_component_ids[monster_id]][-1]
 
     def get_numerical_sort_top_monster_by_id(self, monster_id):
         return self.get_monster(self.get_numerical_sort_top_id_by_id(monster_id))
 
     def get_evo_by_monster_id(self, monster_id) -> Optional[EvolutionModel]:
-        return self._get_edge_model(self.graph[monster_id], 'back_evolution')
+        return self._evo_models.get(monster_id)
 
     def cur_evo_type_by_monster_id(self, monster_id: int) -> EvoType:
         prev_evo = self.get_evo_by_monster_id(monster_id)
@@ -400,30 +451,30 @@ class MonsterGraph(object):
         return self.true_evo_type_by_monster_id(monster.monster_no)
 
     def get_prev_evolution_by_monster_id(self, monster_id):
-        bes = self._get_edges(self.graph[monster_id], 'back_evolution')
+        bes = self._get_edges(monster_id, 'back_evolution')
         if bes:
-            return bes.pop()
+            return next(iter(bes))
         return None
 
     def get_prev_evolution_by_monster(self, monster: MonsterModel):
         return self.get_prev_evolution_by_monster_id(monster.monster_no)
 
     def get_next_evolutions_by_monster_id(self, monster_id):
-        return self._get_edges(self.graph[monster_id], 'evolution')
+        return self._get_edges(monster_id, 'evolution')
 
     def get_next_evolutions_by_monster(self, monster: MonsterModel):
         return self.get_next_evolutions_by_monster_id(monster.monster_no)
 
     def get_prev_transforms_by_monster_id(self, monster_id):
-        return self._get_edges(self.graph[monster_id], 'back_transformation')
+        return self._get_edges(monster_id, 'back_transformation')
 
     def get_prev_transforms_by_monster(self, monster: MonsterModel):
         return self.get_prev_evolution_by_monster_id(monster.monster_no)
 
     def get_next_transform_by_monster_id(self, monster_id):
-        bes = self._get_edges(self.graph[monster_id], 'transformation')
+        bes = self._get_edges(monster_id, 'transformation')
         if bes:
-            return bes.pop()
+            return next(iter(bes))
         return None
 
     def get_next_transform_by_monster(self, monster: MonsterModel):
@@ -440,7 +491,7 @@ class MonsterGraph(object):
 
     # farmable
     def monster_is_farmable_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].is_farmable
+        return self._monsters[monster_id].is_farmable
 
     def monster_is_farmable(self, monster: MonsterModel):
         return self.monster_is_farmable_by_id(monster.monster_no)
@@ -454,7 +505,7 @@ class MonsterGraph(object):
 
     # mp
     def monster_is_mp_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].in_mpshop
+        return self._monsters[monster_id].in_mpshop
 
     def monster_is_mp(self, monster: MonsterModel):
         return self.monster_is_mp_by_id(monster.monster_no)
@@ -468,7 +519,7 @@ class MonsterGraph(object):
 
     # pem
     def monster_is_pem_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].in_pem
+        return self._monsters[monster_id].in_pem
 
     def monster_is_pem(self, monster: MonsterModel):
         return self.monster_is_pem_by_id(monster.monster_no)
@@ -482,7 +533,7 @@ class MonsterGraph(object):
 
     # rem
     def monster_is_rem_by_id(self, monster_id):
-        return self.graph.nodes[monster_id]['model'].in_rem
+        return self._monsters[monster_id].in_rem
 
     def monster_is_rem(self, monster: MonsterModel):
         return self.monster_is_rem_by_id(monster.monster_no)
@@ -536,7 +587,7 @@ class MonsterGraph(object):
         return self.evo_gem_monster_by_id(monster.monster_no)
 
     def material_of_ids_by_id(self, monster_id: int) -> list:
-        return sorted(self._get_edges(self.graph[monster_id], 'material_of'))
+        return sorted(self._get_edges(monster_id, 'material_of'))
 
     def material_of_ids(self, monster: MonsterModel) -> list:
         return self.material_of_ids_by_id(monster.monster_no)
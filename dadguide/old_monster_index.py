@@ -1,7 +1,6 @@
-import difflib
+import re
 
 from redbot.core.utils import AsyncIter
-from discord.utils import find as find_first
 import tsutils
 
 from collections import defaultdict
@@ -10,10 +9,14 @@ from .models.monster_model import MonsterModel
 from .models.enum_types import Attribute
 from .models.enum_types import EvoType
 from .models.enum_types import InternalEvoType
+from .models.enum_types import Server
 from dadguide.models.enum_types import Attribute, MonsterType
 from dadguide.models.monster_model import MonsterModel
 from dadguide.models.series_model import SeriesModel
 from .database_context import DbContext
+from .search_indexes import CloseMatcher, NgramIndex, PrefixIndex
+
+BASE_ID_QUERY_RE = re.compile(r'base (\d+)$')
 
 
 class MonsterIndex(tsutils.aobject):
@@ -98,6 +101,26 @@ class MonsterIndex(tsutils.aobject):
 
         named_monsters.sort(key=named_monsters_sort)
 
+        # Bitmask of servers this index is limited to; None for all servers
+        self.server_mask = None
+        self._nickname_overrides = nickname_overrides
+        self._panthname_overrides = panthname_overrides
+        self._build_tables(named_monsters)
+
+        # The NA and JP indexes share this index's NamedMonsters, and only rebuild the tables
+        self._server_views = {}
+        for server in (Server.NA, Server.JP):
+            self._server_views[server] = self._make_server_view(server)
+
+    def __reduce__(self):
+        # aobject's async __new__ can't recreate an index when unpickling, so restore the
+        # attributes onto a bare instance like _make_server_view does
+        return object.__new__, (type(self),), self.__dict__
+
+    def _build_tables(self, named_monsters):
+        panthname_overrides = self._panthname_overrides
+        nickname_overrides = self._nickname_overrides
+
         # set up a set of all pantheon names, a set of all pantheon nicknames, and a dictionary of nickname -> full name
         # later we will set up a dictionary of pantheon full name -> monsters
         self.all_pantheon_names = set()
@@ -135,9 +158,68 @@ class MonsterIndex(tsutils.aobject):
                 for nickname in nicknames:
                     self.all_entries[nickname] = nm
 
+        # Prefix lookups over the nickname keys and over the full names of the monsters they
+        # point to. Nickname values carry the key's position in all_entries so matches can be
+        # added in the same order as a scan over all_entries.
+        self.nickname_prefix_index = PrefixIndex(
+            (nickname, (rank, nm)) for rank, (nickname, nm) in enumerate(self.all_entries.items()))
+        # monster_id -> NamedMonster, for the monsters that some nickname points to
+        self._entry_monsters_by_id = {nm.monster_id: nm for nm in self.all_entries.values()}
+        entry_monsters = self._entry_monsters_by_id.values()
+        self.name_prefix_index = PrefixIndex(
+            [(nm.name_en.lower(), nm) for nm in entry_monsters]
+            + [(nm.name_ja.lower(), nm) for nm in entry_monsters])
+
+        # Substring lookups over the nickname keys and the lowercased full names of every monster
+        self.nickname_ngram_index = NgramIndex((nickname, nm) for nickname, nm in self.all_entries.items())
+        self.name_ngram_index = NgramIndex(
+            [(nm.name_en.lower(), nm) for nm in named_monsters]
+            + [(nm.name_ja.lower(), nm) for nm in named_monsters])
+
+        # Typo-tolerant lookups over the nickname keys and full english names
+        self.nickname_close_matcher = CloseMatcher(self.all_entries.keys())
+        self.name_close_matcher = CloseMatcher(self.all_en_name_to_monsters.keys())
+
+    def _base_id_match(self, query):
+        """For queries ending in 'base <id>', the NamedMonster for the base of that monster."""
+        match = BASE_ID_QUERY_RE.search(query)
+        # 'base 0012' never matched a monster id, so leading zeros don't match here either
+        if match is None or match.group(1) != str(int(match.group(1))):
+            return None
+        nm = self._entry_monsters_by_id.get(int(match.group(1)))
+        if nm is None:
+            return None
+        return self._entry_monsters_by_id.get(nm.base_monster_no)
+
+    def _entry_names_containing(self, substring):
+        """NamedMonsters with a nickname entry whose full name contains substring."""
+        return [nm for nm in self.name_ngram_index.values_containing(substring)
+                if nm.monster_id in self._entry_monsters_by_id]
+
+    def _nicknames_with_prefix(self, prefix):
+        """NamedMonsters with a nickname starting with prefix, in all_entries order."""
+        return [nm for _, nm in sorted(self.nickname_prefix_index.values_with_prefix(prefix),
+                                       key=lambda rank_nm: rank_nm[0])]
+
     def init_index(self):
         pass
 
+    def for_server(self, server: str) -> 'MonsterIndex':
+        """Get the view of this index limited to monsters on a server, e.g. 'na' or 'jp'."""
+        server = Server[server.upper()]
+        if server not in self._server_views:
+            self._server_views[server] = self._make_server_view(server)
+        return self._server_views[server]
+
+    def _make_server_view(self, server: Server) -> 'MonsterIndex':
+        # aobject's async __new__ rules out copy.copy, so copy the attributes by hand
+        view = object.__new__(type(self))
+        view.__dict__.update(self.__dict__)
+        view._server_views = {}
+        view.server_mask = 1 << server.value
+        view._build_tables([nm for nm in self.all_monsters if nm.servers & view.server_mask])
+        return view
+
     def compute_prefixes(self, m: MonsterModel, evotree: list):
         prefixes = set()
 
@@ -228,7 +310,9 @@ class MonsterIndex(tsutils.aobject):
 
         return prefixes
 
-    def find_monster(self, query):
+    def find_monster(self, query, server: str = None):
+        if server is not None:
+            return self.for_server(server).find_monster(query)
         query = tsutils.rmdiacritics(query).lower().strip()
 
         # id search
@@ -256,33 +340,26 @@ class MonsterIndex(tsutils.aobject):
         matches = set()
 
         # prefix search for ids, take max id
-        for nickname, m in self.all_entries.items():
-            if query.endswith("base {}".format(m.monster_id)):
-                matches.add(
-                    find_first(lambda mo: m.base_monster_no == mo.monster_id, self.all_entries.values()))
+        base_match = self._base_id_match(query)
+        if base_match is not None:
+            matches.add(base_match)
         if len(matches):
             return self.pick_best_monster(matches), None, "Base ID match, max of 1".format()
 
         # prefix search for nicknames, space-preceeded, take max id
-        for nickname, m in self.all_entries.items():
-            if nickname.startswith(query + ' '):
-                matches.add(m)
+        matches.update(self._nicknames_with_prefix(query + ' '))
         if len(matches):
             return self.pick_best_monster(matches), None, "Space nickname prefix, max of {}".format(len(matches))
 
         # prefix search for nicknames, take max id
-        for nickname, m in self.all_entries.items():
-            if nickname.startswith(query):
-                matches.add(m)
+        matches.update(self._nicknames_with_prefix(query))
         if len(matches):
             all_names = ",".join(map(lambda x: x.name_en, matches))
             return self.pick_best_monster(matches), None, "Nickname prefix, max of {}, matches=({})".format(
                 len(matches), all_names)
 
         # prefix search for full name, take max id
-        for nickname, m in self.all_entries.items():
-            if m.name_en.lower().startswith(query) or m.name_ja.lower().startswith(query):
-                matches.add(m)
+        matches.update(self.name_prefix_index.values_with_prefix(query))
         if len(matches):
             return self.pick_best_monster(matches), None, "Full name, max of {}".format(len(matches))
 
@@ -293,32 +370,26 @@ class MonsterIndex(tsutils.aobject):
         # TODO: refactor 2nd search characteristcs for 2nd word
 
         # full name contains on nickname, take max id
-        for nickname, m in self.all_entries.items():
-            if query in m.name_en.lower() or query in m.name_ja.lower():
-                matches.add(m)
+        matches.update(self._entry_names_containing(query))
         if len(matches):
             return self.pick_best_monster(matches), None, 'Nickname contains nickname match ({})'.format(
                 len(matches))
 
         # No decent matches. Try near hits on nickname instead
-        matches = difflib.get_close_matches(query, self.all_entries.keys(), n=1, cutoff=.8)
+        matches = self.nickname_close_matcher.get_close_matches(query, n=1, cutoff=.8)
         if len(matches):
             match = matches[0]
             return self.all_entries[match], None, 'Close nickname match ({})'.format(match)
 
         # Still no decent matches. Try near hits on full name instead
-        matches = difflib.get_close_matches(
-            query, self.all_en_name_to_monsters.keys(), n=1, cutoff=.9)
+        matches = self.name_close_matcher.get_close_matches(query, n=1, cutoff=.9)
         if len(matches):
             match = matches[0]
             return self.all_en_name_to_monsters[match], None, 'Close name match ({})'.format(match)
 
         # About to give up, try matching all words
-        matches = set()
-        for nickname, m in self.all_entries.items():
-            if (all(map(lambda x: x in m.name_en.lower(), query.split())) or
-                            all(map(lambda x: x in m.name_ja.lower(), query.split()))):
-                matches.add(m)
+        matches = set(nm for nm in self.name_ngram_index.values_containing_all(query.split())
+                      if nm.monster_id in self._entry_monsters_by_id)
         if len(matches):
             return self.pick_best_monster(matches), None, 'All word match on full name, max of {}'.format(
                 len(matches))
@@ -326,7 +397,7 @@ class MonsterIndex(tsutils.aobject):
         # couldn't find anything
         return None, "Could not find a match for: " + query, None
 
-    def find_monster2(self, query):
+    def find_monster2(self, query, server: str = None):
         """Search with alternative method for resolving prefixes.
 
         Implements the lookup for id2, where you are allowed to specify multiple prefixes for a card.
@@ -334,6 +405,8 @@ class MonsterIndex(tsutils.aobject):
         Follows a similar logic to the regular id but after each check, will remove any potential match that doesn't
         contain every single specified prefix.
         """
+        if server is not None:
+            return self.for_server(server).find_monster2(query)
         query = tsutils.rmdiacritics(query).lower().strip()
         # id search
         if query.isdigit():
@@ -369,26 +442,24 @@ class MonsterIndex(tsutils.aobject):
         if len(query_prefixes) < 1:
             return self.find_monster(query)
 
-        matches = PotentialMatches()
+        matches = PotentialMatches(self.server_mask)
 
         # prefix search for ids, take max id
-        for nickname, m in self.all_entries.items():
-            if query.endswith("base {}".format(m.monster_id)):
-                matches.add(
-                    find_first(lambda mo: m.base_monster_no == mo.monster_id, self.all_entries.values()))
+        base_match = self._base_id_match(query)
+        if base_match is not None:
+            matches.add(base_match)
         matches.update_list(query_prefixes)
 
         # first try to get matches from nicknames
-        for nickname, m in self.all_entries.items():
-            if new_query in nickname:
-                matches.add(m)
+        for m in self.nickname_ngram_index.values_containing(new_query):
+            matches.add(m)
         matches.update_list(query_prefixes)
 
         # if we don't have any candidates yet, pick a new method
         if not matches.length():
             # try matching on exact names next
-            for nickname, m in self.all_en_name_to_monsters.items():
-                if new_query in m.name_en.lower() or new_query in m.name_ja.lower():
+            for m in self.name_ngram_index.values_containing(new_query):
+                if self.all_en_name_to_monsters.get(m.name_en.lower()) is m:
                     matches.add(m)
             matches.update_list(query_prefixes)
 
@@ -418,8 +489,9 @@ class MonsterIndex(tsutils.aobject):
 
 
 class PotentialMatches(object):
-    def __init__(self):
+    def __init__(self, server_mask=None):
         self.match_list = set()
+        self.server_mask = server_mask
 
     def add(self, m):
         self.match_list.add(m)
@@ -438,7 +510,8 @@ class PotentialMatches(object):
         to_add = set()
         for m in self.match_list:
             for evo in m.evolution_tree:
-                to_add.add(evo)
+                if self.server_mask is None or evo.servers & self.server_mask:
+                    to_add.add(evo)
         self.match_list.update(to_add)
 
     def _remove_any_without_all_prefixes(self, query_prefixes):
@@ -558,6 +631,14 @@ class NamedMonster(object):
         self.monster_no_na = monster.monster_no_na
         self.monster_no_jp = monster.monster_no_jp
 
+        # Bitmask of the Servers this monster is available on
+        self.servers = 0
+        for server, available in ((Server.JP, monster.on_jp),
+                                  (Server.NA, monster.on_na),
+                                  (Server.KR, monster.on_kr)):
+            if available:
+                self.servers |= 1 << server.value
+
         # ID of the root of the tree for this monster
         self.base_monster_no = base_monster.monster_id
         self.base_monster_no_na = base_monster.monster_no_na
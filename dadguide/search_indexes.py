@@ -0,0 +1,132 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from heapq import nlargest
+
+
+class PrefixIndex(object):
+    """Sorted string keys with their values, for prefix lookups in O(log n + k).
+
+    Keys may repeat; every (key, value) pair is kept.
+    """
+
+    def __init__(self, items):
+        pairs = sorted(items, key=lambda kv: kv[0])
+        self._keys = [k for k, _ in pairs]
+        self._values = [v for _, v in pairs]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def values_with_prefix(self, prefix: str):
+        """Yield the values of every key that starts with prefix, in key order."""
+        keys = self._keys
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            yield self._values[i]
+            i += 1
+
+
+class NgramIndex(object):
+    """Trigram posting lists over texts, for substring lookups.
+
+    A substring query intersects the posting lists of its trigrams, and only the texts in
+    the intersection are checked with `in`. Substrings shorter than a trigram check every
+    text. Values are returned in insertion order.
+    """
+    N = 3
+
+    def __init__(self, items):
+        self._texts = []
+        self._values = []
+        self._postings = defaultdict(set)
+        for text, value in items:
+            idx = len(self._texts)
+            self._texts.append(text)
+            self._values.append(value)
+            for gram in self._ngrams(text):
+                self._postings[gram].add(idx)
+
+    def __len__(self):
+        return len(self._texts)
+
+    @classmethod
+    def _ngrams(cls, text: str):
+        return {text[i:i + cls.N] for i in range(len(text) - cls.N + 1)}
+
+    def _candidates(self, substring: str):
+        grams = self._ngrams(substring)
+        if not grams:
+            return range(len(self._texts))
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        return sorted(set(postings[0]).intersection(*postings[1:]))
+
+    def values_containing(self, substring: str):
+        """Yield the values of every text containing substring."""
+        for idx in self._candidates(substring):
+            if substring in self._texts[idx]:
+                yield self._values[idx]
+
+    def values_containing_all(self, substrings: list):
+        """Yield the values of every text containing all of the substrings."""
+        if not substrings:
+            yield from self._values
+            return
+        # Verify against the most selective substring's candidates
+        candidates = min((self._candidates(s) for s in substrings), key=len)
+        for idx in candidates:
+            text = self._texts[idx]
+            if all(s in text for s in substrings):
+                yield self._values[idx]
+
+
+class CloseMatcher(object):
+    """difflib.get_close_matches over a fixed set of keys, built once.
+
+    Results are exactly what get_close_matches would return for the same keys. The number
+    of characters each key shares with the query (the numerator of quick_ratio) is counted
+    for all keys at once from (char, occurrence) posting lists, so only keys whose
+    quick_ratio passes the cutoff pay for a full SequenceMatcher.ratio().
+    """
+
+    def __init__(self, keys):
+        self._keys = list(keys)
+        self._lengths = [len(key) for key in self._keys]
+        # (char, n) -> indexes of the keys containing char at least n times
+        self._postings = defaultdict(list)
+        for idx, key in enumerate(self._keys):
+            for char, count in Counter(key).items():
+                for n in range(1, count + 1):
+                    self._postings[(char, n)].append(idx)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _candidates(self, word, cutoff):
+        if not word or cutoff <= 0:
+            # Keys sharing no characters with the query can still pass; check everything
+            return range(len(self._keys))
+        shared = Counter()
+        for char, count in Counter(word).items():
+            for n in range(1, count + 1):
+                shared.update(self._postings.get((char, n), ()))
+        word_len = len(word)
+        lengths = self._lengths
+        # Same arithmetic as difflib's quick_ratio, so the cutoff compares identically
+        return [idx for idx, matches in shared.items()
+                if 2.0 * matches / (lengths[idx] + word_len) >= cutoff]
+
+    def get_close_matches(self, word, n=3, cutoff=0.6):
+        if not n > 0:
+            raise ValueError("n must be > 0: %r" % (n,))
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError("cutoff must be in [0.0, 1.0]: %r" % (cutoff,))
+        s = SequenceMatcher()
+        s.set_seq2(word)
+        result = []
+        for idx in self._candidates(word, cutoff):
+            s.set_seq1(self._keys[idx])
+            score = s.ratio()
+            if score >= cutoff:
+                result.append((score, self._keys[idx]))
+        return [key for score, key in nlargest(n, result)]
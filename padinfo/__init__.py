@@ -7,3 +7,4 @@ def setup(bot):
     n = PadInfo(bot)
     bot.add_cog(n)
     bot.loop.create_task(n.reload_nicknames())
+    bot.loop.create_task(n.flush_historic_lookups())
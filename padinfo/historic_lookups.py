@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+
+from tsutils import safe_read_json
+
+logger = logging.getLogger('red.padbot-cogs.padinfo.historic_lookups')
+
+# Compact once the log holds at least this many entries and at least as many as the
+# snapshot, so small snapshots aren't rewritten on every flush
+COMPACT_MIN_LOG_ENTRIES = 1000
+
+
+class HistoricLookups(object):
+    """query -> monster_no for every lookup made, persisted in batches.
+
+    The state on disk is a JSON snapshot at file_path plus an append-only log of
+    [query, monster_no] lines next to it. record() only updates memory; flush() appends the
+    lookups recorded since the last flush to the log, and rewrites the snapshot (emptying
+    the log) once the log is as long as the snapshot and COMPACT_MIN_LOG_ENTRIES.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.log_path = file_path + '.log'
+        self.lookups = safe_read_json(file_path)
+        self._pending = {}
+        self._log_entries = 0
+        self._replay_log()
+
+    def __iter__(self):
+        return iter(self.lookups)
+
+    def __len__(self):
+        return len(self.lookups)
+
+    def _replay_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        malformed = False
+        with open(self.log_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    query, monster_no = json.loads(line)
+                except ValueError:
+                    # A write interrupted mid-line; everything before it is intact
+                    logger.warning('Skipping malformed line in %s', self.log_path)
+                    malformed = True
+                    continue
+                self.lookups[query] = monster_no
+                self._log_entries += 1
+        if malformed:
+            # Don't append after a partial line
+            self.compact()
+
+    def record(self, query: str, monster_no: int):
+        if self.lookups.get(query) == monster_no:
+            return
+        self.lookups[query] = monster_no
+        self._pending[query] = monster_no
+
+    def flush(self):
+        """Write out the lookups recorded since the last flush."""
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                for query, monster_no in pending.items():
+                    f.write(json.dumps([query, monster_no]) + '\n')
+            self._log_entries += len(pending)
+
+        if self._log_entries >= max(COMPACT_MIN_LOG_ENTRIES, len(self.lookups)):
+            self.compact()
+
+    def compact(self):
+        """Fold the log into the snapshot."""
+        self._pending = {}
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.lookups, f)
+        os.replace(tmp_path, self.file_path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self._log_entries = 0
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+
+class LookupCache(object):
+    """Bounded LRU cache of monster lookup results for one index generation.
+
+    Keys are (lookup kind, server filter, query); values are (monster_id, err, debug_info)
+    with monster_id None on a failed lookup. Call new_generation when the index is
+    swapped; results computed against the old index are dropped.
+    """
+
+    def __init__(self, max_size=2000):
+        self.max_size = max_size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def new_generation(self):
+        self.generation += 1
+        self._results.clear()
+
+    def get(self, key):
+        """Return the cached result for key, or None on a miss."""
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0
+        return ('generation {}: {}/{} entries, {} hits, {} misses ({:.1%} hit rate)'
+                .format(self.generation, len(self), self.max_size, self.hits, self.misses, hit_rate))
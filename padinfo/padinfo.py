@@ -15,9 +15,11 @@ import tsutils
 from redbot.core import checks, commands, data_manager, Config
 from redbot.core.utils import AsyncIter
 from redbot.core.utils.chat_formatting import box, inline
-from tsutils import CogSettings, EmojiUpdater, Menu, char_to_emoji, rmdiacritics, safe_read_json, is_donor
+from tsutils import CogSettings, EmojiUpdater, Menu, char_to_emoji, rmdiacritics, is_donor
 
+from .historic_lookups import HistoricLookups
 from .id_menu import IdMenu
+from .lookup_cache import LookupCache
 
 if TYPE_CHECKING:
     from dadguide.database_context import DbContext
@@ -48,6 +50,8 @@ submit an override suggestion: https://docs.google.com/forms/d/1kJH9Q0S8iqqULwrR
 
 EMBED_NOT_GENERATED = -1
 
+HISTORIC_LOOKUPS_FLUSH_SECS = 30
+
 
 class ServerFilter(Enum):
     any = 0
@@ -169,9 +173,11 @@ class PadInfo(commands.Cog):
         self.settings = PadInfoSettings("padinfo")
 
         self.index_all = None
-        self.index_na = None
-        self.index_jp = None
-        self.index_lock = asyncio.Lock()
+        # Set once index_all is first loaded. Refreshes replace index_all in a single
+        # assignment, so lookups only ever wait for the first load
+        self.index_ready = asyncio.Event()
+        # Lookup results for the current index_all, shared by every _findMonster caller
+        self.lookup_cache = LookupCache()
 
         self.menu = Menu(bot)
 
@@ -192,11 +198,8 @@ class PadInfo(commands.Cog):
         self.last_monster_emoji = '\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE}'
         self.remove_emoji = self.menu.emoji['no']
 
-        self.historic_lookups_file_path = _data_file('historic_lookups.json')
-        self.historic_lookups = safe_read_json(self.historic_lookups_file_path)
-
-        self.historic_lookups_file_path_id2 = _data_file('historic_lookups_id2.json')
-        self.historic_lookups_id2 = safe_read_json(self.historic_lookups_file_path_id2)
+        self.historic_lookups = HistoricLookups(_data_file('historic_lookups.json'))
+        self.historic_lookups_id2 = HistoricLookups(_data_file('historic_lookups_id2.json'))
 
         self.config = Config.get_conf(self, identifier=9401770)
         self.config.register_user(survey_mode=0, color=None)
@@ -205,10 +208,10 @@ class PadInfo(commands.Cog):
     def cog_unload(self):
         # Manually nulling out database because the GC for cogs seems to be pretty shitty
         self.index_all = None
-        self.index_na = None
-        self.index_jp = None
-        self.historic_lookups = {}
-        self.historic_lookups_id2 = {}
+        self.index_ready.clear()
+        self.lookup_cache.new_generation()
+        self.historic_lookups.compact()
+        self.historic_lookups_id2.compact()
 
     async def red_get_data_for_user(self, *, user_id):
         """Get a user's personal data."""
@@ -234,6 +237,16 @@ class PadInfo(commands.Cog):
 
             await asyncio.sleep(wait_time)
 
+    async def flush_historic_lookups(self):
+        while self == self.bot.get_cog('PadInfo'):
+            try:
+                self.historic_lookups.flush()
+                self.historic_lookups_id2.flush()
+            except Exception as ex:
+                logger.exception("flushing historic lookups caught exception " + str(ex))
+
+            await asyncio.sleep(HISTORIC_LOOKUPS_FLUSH_SECS)
+
     async def refresh_index(self):
         """Refresh the monster indexes."""
         dg_cog = self.bot.get_cog('Dadguide')
@@ -243,15 +256,14 @@ class PadInfo(commands.Cog):
         logger.info('Waiting until DG is ready')
         await dg_cog.wait_until_ready()
 
-        async with self.index_lock:
-            logger.debug('Loading ALL index')
-            self.index_all = await dg_cog.create_index()
-
-            logger.debug('Loading NA index')
-            self.index_na = await dg_cog.create_index(lambda m: m.on_na)
-
-            logger.debug('Loading JP index')
-            self.index_jp = await dg_cog.create_index(lambda m: m.on_jp)
+        # Dadguide builds the full index when it refreshes; the NA and JP indexes are
+        # views derived from it. Lookups keep using the previous index until it's swapped
+        # out here, and nothing awaits between the swap and the cache reset
+        logger.debug('Loading index')
+        if dg_cog.index is not self.index_all:
+            self.index_all = dg_cog.index
+            self.lookup_cache.new_generation()
+        self.index_ready.set()
 
         logger.info('Done refreshing indexes')
 
@@ -836,6 +848,12 @@ class PadInfo(commands.Cog):
         self.settings.setVoiceDir(path)
         await ctx.tick()
 
+    @padinfo.command()
+    @checks.is_owner()
+    async def lookupcache(self, ctx):
+        """Show the monster lookup cache counters"""
+        await ctx.send(box(self.lookup_cache.stats()))
+
     @checks.is_owner()
     @padinfo.command()
     async def iddiff(self, ctx):
@@ -879,53 +897,55 @@ class PadInfo(commands.Cog):
         query = rmdiacritics(query)
         nm, err, debug_info = await self._findMonster(query, server_filter)
 
-        monster_no = nm.monster_id if nm else -1
-        self.historic_lookups[query] = monster_no
-        json.dump(self.historic_lookups, open(self.historic_lookups_file_path, "w+"))
+        self.historic_lookups.record(query, nm.monster_id if nm else -1)
 
         m = self.get_monster(nm.monster_id) if nm else None
 
         return m, err, debug_info
 
     async def _findMonster(self, query, server_filter=ServerFilter.any) -> "NamedMonster":
-        while self.index_lock.locked():
-            await asyncio.sleep(1)
+        await self.index_ready.wait()
 
-        if server_filter == ServerFilter.any:
-            monster_index = self.index_all
-        elif server_filter == ServerFilter.na:
-            monster_index = self.index_na
-        elif server_filter == ServerFilter.jp:
-            monster_index = self.index_jp
-        else:
-            raise ValueError("server_filter must be type ServerFilter not " + str(type(server_filter)))
-        return monster_index.find_monster(query)
+        return self._cached_lookup('id', query, server_filter)
 
     async def findMonster2(self, query, server_filter=ServerFilter.any):
         query = rmdiacritics(query)
         nm, err, debug_info = await self._findMonster2(query, server_filter)
 
-        monster_no = nm.monster_id if nm else -1
-        self.historic_lookups_id2[query] = monster_no
-        json.dump(self.historic_lookups_id2, open(self.historic_lookups_file_path_id2, "w+"))
+        self.historic_lookups_id2.record(query, nm.monster_id if nm else -1)
 
         m = self.get_monster(nm.monster_id) if nm else None
 
         return m, err, debug_info
 
     async def _findMonster2(self, query, server_filter=ServerFilter.any):
-        while self.index_lock.locked():
-            await asyncio.sleep(1)
+        await self.index_ready.wait()
 
-        if server_filter == ServerFilter.any:
-            monster_index = self.index_all
-        elif server_filter == ServerFilter.na:
-            monster_index = self.index_na
-        elif server_filter == ServerFilter.jp:
-            monster_index = self.index_jp
+        return self._cached_lookup('id2', query, server_filter)
+
+    def _cached_lookup(self, kind, query, server_filter):
+        server = self._server_name(server_filter)
+        key = (kind, server, query)
+        cached = self.lookup_cache.get(key)
+        if cached is not None:
+            monster_id, err, debug_info = cached
+            nm = self.index_all.monster_id_to_named_monster[monster_id] if monster_id is not None else None
+            return nm, err, debug_info
+
+        if kind == 'id':
+            nm, err, debug_info = self.index_all.find_monster(query, server=server)
         else:
+            nm, err, debug_info = self.index_all.find_monster2(query, server=server)
+        self.lookup_cache.put(key, (nm.monster_id if nm else None, err, debug_info))
+        return nm, err, debug_info
+
+    @staticmethod
+    def _server_name(server_filter):
+        if not isinstance(server_filter, ServerFilter):
             raise ValueError("server_filter must be type ServerFilter not " + str(type(server_filter)))
-        return monster_index.find_monster2(query)
+        if server_filter == ServerFilter.any:
+            return None
+        return server_filter.name
 
 
 class PadInfoSettings(CogSettings):
@@ -0,0 +1,142 @@
+from collections import defaultdict
+
+import numpy as np
+
+GLOB_SPECIAL_CHARS = '*?['
+
+
+class MonsterTable(object):
+    """Columnar view of the monster fields that search filters on numerically.
+
+    Built once per Dadguide database load. Row i of every column describes monsters[i], so
+    numeric and enum filters evaluate as boolean masks over whole columns; text filters
+    still run per monster on the rows that survive.
+    """
+
+    def __init__(self, db_context: "DbContext"):
+        self.database = db_context
+        self.monsters = list(db_context.get_all_monsters())
+        ms = self.monsters
+
+        def int_column(values):
+            # None (no skill) is stored as 0, which no threshold filter accepts
+            return np.array([v or 0 for v in values], dtype=np.int64)
+
+        self.hp, self.atk, self.rcv, self.weighted = db_context.get_monster_stats(ms, lv=110)
+        self.cd_min = int_column(m.search.active_min for m in ms)
+        self.cd_max = int_column(m.search.active_max for m in ms)
+
+        self.attr1 = np.array([m.attr1.name.lower() for m in ms])
+        self.attr2 = np.array([m.attr2.name.lower() for m in ms])
+
+        # Lowercase, as in TYPES and the type() filter
+        type_names = sorted({t.name.lower() for m in ms for t in m.types})
+        self.type_bits = {name: 1 << i for i, name in enumerate(type_names)}
+        self.types = np.array([sum(self.type_bits[t.name.lower()] for t in m.types) for m in ms],
+                              dtype=np.int64)
+
+        self.active_index = TextIndex([m.search.active for m in ms])
+        self.active_desc_index = TextIndex([m.search.active_desc for m in ms])
+        self.leader_index = TextIndex([m.search.leader for m in ms])
+
+        self.inheritable = np.array([bool(m.is_inheritable) for m in ms], dtype=bool)
+        self.farmable_evo = np.array([db_context.graph.monster_is_farmable_evo(m) for m in ms],
+                                     dtype=bool)
+
+    def __len__(self):
+        return len(self.monsters)
+
+    def all_rows(self):
+        return np.ones(len(self.monsters), dtype=bool)
+
+    def row_mask(self, fn):
+        """A mask from a per-monster predicate, for filters with no column."""
+        return np.fromiter((bool(fn(m)) for m in self.monsters), dtype=bool, count=len(self.monsters))
+
+    def has_type(self, type_name: str):
+        return (self.types & self.type_bits.get(type_name, 0)) != 0
+
+    def select(self, mask):
+        return [self.monsters[i] for i in np.flatnonzero(mask)]
+
+
+def glob_literals(pattern: str):
+    """The literal runs of an fnmatch pattern; any text the pattern matches contains them all."""
+    literals = []
+    current = ''
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c not in GLOB_SPECIAL_CHARS:
+            current += c
+            continue
+        if current:
+            literals.append(current)
+        current = ''
+        if c == '[':
+            # Skip the bracket expression, finding its end the way fnmatch does; an unclosed
+            # '[' only ends the run
+            j = i
+            if pattern[j:j + 1] == '!':
+                j += 1
+            if pattern[j:j + 1] == ']':
+                j += 1
+            close = pattern.find(']', j)
+            if close >= 0:
+                i = close + 1
+    if current:
+        literals.append(current)
+    return literals
+
+
+class TextIndex(object):
+    """Trigram posting lists over one text column, for substring filters.
+
+    A substring filter intersects the postings of its trigrams and only checks the texts in
+    the intersection; substrings shorter than a trigram check every text.
+    """
+    N = 3
+
+    def __init__(self, texts):
+        self.texts = texts
+        postings = defaultdict(list)
+        for idx, text in enumerate(texts):
+            for gram in self._ngrams(text):
+                postings[gram].append(idx)
+        self._postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self._no_rows = np.array([], dtype=np.int32)
+
+    @classmethod
+    def _ngrams(cls, text: str):
+        return {text[i:i + cls.N] for i in range(len(text) - cls.N + 1)}
+
+    def _candidates(self, substring: str):
+        grams = self._ngrams(substring)
+        if not grams:
+            return np.arange(len(self.texts), dtype=np.int32)
+        postings = sorted((self._postings.get(gram, self._no_rows) for gram in grams), key=len)
+        rows = postings[0]
+        for other in postings[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def mask_containing(self, substring: str):
+        """A row mask of the texts containing substring."""
+        return self.mask_containing_all([substring])
+
+    def mask_containing_all(self, substrings):
+        """A row mask of the texts containing every one of substrings."""
+        mask = np.zeros(len(self.texts), dtype=bool)
+        if not substrings:
+            mask[:] = True
+            return mask
+        candidates = min((self._candidates(s) for s in substrings), key=len)
+        texts = self.texts
+        for idx in candidates:
+            text = texts[idx]
+            if all(s in text for s in substrings):
+                mask[idx] = True
+        return mask
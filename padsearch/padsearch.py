@@ -1,14 +1,21 @@
 import json
 import logging
 import re
+import time
 from io import BytesIO
 from fnmatch import fnmatch
+from functools import lru_cache
+
+import numpy as np
 from ply import lex
 from redbot.core import checks
 from redbot.core import commands
 from redbot.core.utils.chat_formatting import box, pagify
 from tsutils import timeout_after
 
+from .monster_table import MonsterTable, glob_literals
+from .regex_runner import RegexRunner, regex_literals
+
 logger = logging.getLogger('red.padbot-cogs.padsearch')
 
 HELP_MSG = """
@@ -55,6 +62,52 @@ Multiple instance filters
 """
 
 
+REMOVE_GEMS_SPEC = 'remove( gem)'
+
+# One spec per filter documented in HELP_MSG, for [p]benchsearch
+BENCHMARK_SPECS = [
+    'hp(5000)',
+    'atk(3000)',
+    'rcv(500)',
+    'weighted(1000)',
+    'cd(4)',
+    'farmable',
+    'haste(2)',
+    'inheritable',
+    'shuffle',
+    'unlock',
+    'delay(1)',
+    'attabsorb',
+    'absorbnull',
+    'combo(2)',
+    'shield(50)',
+    'resolve',
+    'active(heal)',
+    'active(orbs*to)',
+    "reactive(r'(fire|water) orbs')",
+    'board(fire,water,wood,light,dark,heal)',
+    'color(fire)',
+    'column(light)',
+    'hascolor(dark)',
+    'leader(attr.)',
+    'leader(atk*hp)',
+    "releader(r'\\d+x atk')",
+    'name(dragon)',
+    'row(fire)',
+    'type(dragon)',
+    'convert(fire, water)',
+    'color(fire) type(dragon) hp(3000) cd(8) active(orbs)',
+]
+
+# MonsterSearchHelper fields that reactive()/releader() patterns search
+REGEX_COLUMNS = ('active', 'leader')
+
+# Relative cost of the per-monster filters, used to order them
+FILTER_COST_LOOKUP = 0
+FILTER_COST_SUBSTRING = 1
+FILTER_COST_BOARD = 2
+
+
 @timeout_after(1)
 def filt_timeout(filts, ms):
     for f in filts:
@@ -418,7 +471,7 @@ class PadSearchLexer(object):
 
 class SearchConfig(object):
 
-    def __init__(self, lexer, db_context: "DbContext"):
+    def __init__(self, lexer):
         self.all = False
         self.cd = None
         self.farmable = None
@@ -507,90 +560,91 @@ class SearchConfig(object):
             if type == 'CONVERT':
                 self.convert.append(value)
 
+        # Filters over MonsterTable columns; each maps the table to a boolean row mask
+        self.column_filters = list()
+        # (cost, filter) pairs; sorted by cost into filters once every filter is added
+        self._costed_filters = list()
         self.filters = list()
-        self.re_filters = list()
+        # (pattern, column) pairs, run by a RegexRunner over REGEX_COLUMNS
+        self.re_searches = list()
         self.gl_filters = list()
         self.regeces = list()
         self.globs = list()
 
         # Single
         if self.cd:
-            self.filters.append(lambda m: m.search.active_min and m.search.active_min <= self.cd)
+            self.column_filters.append(lambda t: (t.cd_min > 0) & (t.cd_min <= self.cd))
 
         if self.farmable:
-            self.filters.append(lambda m: db_context.graph.monster_is_farmable_evo(m))
+            self.column_filters.append(lambda t: t.farmable_evo)
 
         if self.haste:
             text = "charge allies' skill by {}".format(self.haste)
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.inheritable:
-            self.filters.append(lambda m: m.is_inheritable)
+            self.column_filters.append(lambda t: t.inheritable)
 
         if self.shuffle:
             text = 'replace all'
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.unlock:
             text = 'unlock all orbs'
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.resolve:
             text = 'may survive when'
-            self.filters.append(lambda m, t=text: t in m.search.leader)
+            self.column_filters.append(lambda tb, t=text: tb.leader_index.mask_containing(t))
 
         if self.delay:
             text = 'delay enemies for {}'.format(self.delay)
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.combo:
             text = 'increase combo count by {}'.format(self.combo)
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.convert:
             text_from = self.convert[0][0]
             text_to = self.convert[0][1]
-            self.filters.append(lambda m,
-                                       tt=text_to,
-                                       tf=text_from:
-                                [tt] in m.search.orb_convert.values() if text_from == 'any' else
-                                (tf in m.search.orb_convert.keys() if text_to == 'any' else
-                                 (tf in m.search.orb_convert.keys() and
-                                  tt in m.search.orb_convert[tf])))
+            self.add_filter(lambda m,
+                                   tt=text_to,
+                                   tf=text_from:
+                            [tt] in m.search.orb_convert.values() if text_from == 'any' else
+                            (tf in m.search.orb_convert.keys() if text_to == 'any' else
+                             (tf in m.search.orb_convert.keys() and
+                              tt in m.search.orb_convert[tf])),
+                            FILTER_COST_LOOKUP)
 
         if self.absorbnull:
             text = 'damage absorb shield'
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.attabsorb:
             text = 'att. absorb shield'
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.shield:
             text = 'damage taken by {}%'.format(self.shield)
-            self.filters.append(lambda m, t=text: t in m.search.active_desc)
+            self.column_filters.append(lambda tb, t=text: tb.active_desc_index.mask_containing(t))
 
         if self.atk:
-            self.filters.append(lambda m: m.search.atk and m.search.atk >= self.atk)
+            self.column_filters.append(lambda t: t.atk >= self.atk)
 
         if self.hp:
-            self.filters.append(lambda m: m.search.hp and m.search.hp >= self.hp)
+            self.column_filters.append(lambda t: t.hp >= self.hp)
 
         if self.rcv:
-            self.filters.append(lambda m: m.search.rcv and m.search.rcv >= self.rcv)
+            self.column_filters.append(lambda t: t.rcv >= self.rcv)
 
         if self.weighted:
-            self.filters.append(
-                lambda m: m.search.weighted_stats and m.search.weighted_stats >= self.weighted)
+            self.column_filters.append(lambda t: t.weighted >= self.weighted)
 
         # Multiple
         if self.reactive:
-            filters = []
             for ft in self.reactive:
-                text = ft.lower()
-                filters.append(lambda m, t=text: re.search(t, m.search.active))
-                self.regeces.append(text)
-            self.re_filters.extend(filters)
+                self.add_regex(ft.lower(), 'active')
 
         if self.active:
             filters = []
@@ -598,20 +652,20 @@ class SearchConfig(object):
                 text = "*" + ft.lower() + "*"
                 filters.append(lambda m, t=text: fnmatch(m.search.active, t))
                 self.globs.append(text)
+                # Only monsters containing the pattern's literal parts can match it
+                self.column_filters.append(
+                    lambda tb, ls=glob_literals(text): tb.active_index.mask_containing_all(ls))
             self.gl_filters.extend(filters)
 
         if self.board:
             filters = []
             for colors in self.board:
                 filters.append(board_filter(colors))
-            self.filters.append(self.or_filters(filters))
+            self.add_filter(self.or_filters(filters), FILTER_COST_BOARD)
 
         if self.color:
-            filters = []
-            for ft in self.color:
-                text = ft.lower()
-                filters.append(lambda m, c=text: c in m.search.color)
-            self.filters.append(self.or_filters(filters))
+            colors = [ft.lower() for ft in self.color]
+            self.column_filters.append(lambda t, cs=colors: np.isin(t.attr1, cs))
 
         if self.column:
             filters = []
@@ -621,22 +675,16 @@ class SearchConfig(object):
                     filters.append(lambda m: m.search.column_convert)
                 else:
                     filters.append(lambda m, t=text: t in m.search.column_convert)
-            self.filters.append(self.or_filters(filters))
+            self.add_filter(self.or_filters(filters), FILTER_COST_LOOKUP)
 
         if self.hascolor:
-            filters = []
-            for ft in self.hascolor:
-                text = ft.lower()
-                filters.append(lambda m, c=text: c in m.search.hascolor)
-            self.filters.append(self.or_filters(filters))
+            colors = [ft.lower() for ft in self.hascolor]
+            self.column_filters.append(
+                lambda t, cs=colors: np.isin(t.attr1, cs) | np.isin(t.attr2, cs))
 
         if self.releader:
-            filters = []
             for ft in self.releader:
-                text = ft.lower()
-                filters.append(lambda m, t=text: re.search(t, m.search.leader))
-                self.regeces.append(text)
-            self.re_filters.extend(filters)
+                self.add_regex(ft.lower(), 'leader')
 
         if self.leader:
             filters = []
@@ -644,6 +692,8 @@ class SearchConfig(object):
                 text = "*" + ft.lower() + "*"
                 filters.append(lambda m, t=text: fnmatch(m.search.leader, t))
                 self.globs.append(text)
+                self.column_filters.append(
+                    lambda tb, ls=glob_literals(text): tb.leader_index.mask_containing_all(ls))
             self.gl_filters.extend(filters)
 
         if self.name:
@@ -651,7 +701,7 @@ class SearchConfig(object):
             for ft in self.name:
                 text = ft.lower()
                 filters.append(lambda m, t=text: t in m.search.name)
-            self.filters.append(self.or_filters(filters))
+            self.add_filter(self.or_filters(filters))
 
         if self.row:
             filters = []
@@ -661,39 +711,64 @@ class SearchConfig(object):
                     filters.append(lambda m: m.search.row_convert)
                 else:
                     filters.append(lambda m, t=text: t in m.search.row_convert)
-            self.filters.append(self.or_filters(filters))
+            self.add_filter(self.or_filters(filters), FILTER_COST_LOOKUP)
 
         if self.types:
-            filters = []
-            for ft in self.types:
-                text = ft.lower()
-                filters.append(lambda m, t=text: t in m.search.types)
-            self.filters.append(self.or_filters(filters))
+            types = [ft.lower() for ft in self.types]
+            self.column_filters.append(
+                lambda t, ts=types: np.logical_or.reduce([t.has_type(ty) for ty in ts]))
 
         if self.remove:
             filters = []
             for ft in self.remove:
                 text = ft.lower()
                 filters.append(lambda m, t=text: t not in m.search.name)
-            self.filters.append(self.or_filters(filters))
-        if not self.filters and not self.re_filters and not self.gl_filters:
+            self.add_filter(self.or_filters(filters))
+        if not (self.column_filters or self._costed_filters or self.re_searches or self.gl_filters):
             raise commands.UserFeedbackCheckFailure('You need to specify at least one filter')
 
+        # Cheapest per-monster checks first, so the costlier ones see fewer monsters
+        self._costed_filters.sort(key=lambda cf: cf[0])
+        self.filters = [f for _, f in self._costed_filters]
+
+    def add_filter(self, fn, cost=FILTER_COST_SUBSTRING):
+        self._costed_filters.append((cost, fn))
+
+    def add_regex(self, pattern, column):
+        try:
+            literals = regex_literals(pattern)
+        except re.error as e:
+            raise commands.UserFeedbackCheckFailure("Regex search threw error '{}'".format(e.msg))
+        self.re_searches.append((pattern, REGEX_COLUMNS.index(column)))
+        self.regeces.append(pattern)
+        # Only monsters containing the pattern's literal parts can match it
+        index_name = column + '_index'
+        self.column_filters.append(
+            lambda tb, ls=literals: getattr(tb, index_name).mask_containing_all(ls))
+
+    def column_mask(self, table: MonsterTable):
+        mask = table.all_rows()
+        for f in self.column_filters:
+            mask &= f(table)
+        return mask
+
     def check_filters(self, m):
         for f in self.filters:
             if not f(m):
                 return False
         return True
 
-    async def check_re_filters(self, ms, ctx):
+    async def check_re_filters(self, ms, ctx, regex_runner: RegexRunner):
+        if not self.re_searches:
+            return ms
+        rows = [tuple(getattr(m.search, column) for column in REGEX_COLUMNS) for m in ms]
         try:
-            return filt_timeout(self.re_filters, ms)
+            matched = await regex_runner.search_rows(self.re_searches, rows)
         except TimeoutError:
             logger.error("Timeout with patttern: \"{}\" by user {} ({})".format(
                 '", "'.join(self.regeces), ctx.author.name, ctx.author.id))
             raise commands.UserFeedbackCheckFailure("Regex took too long to compile.  Stop trying to break the bot")
-        except re.error as e:
-            raise commands.UserFeedbackCheckFailure("Regex search threw error '{}'".format(e.msg))
+        return [ms[i] for i in matched]
 
     async def check_glob_filters(self, ms, ctx):
         try:
@@ -720,6 +795,20 @@ class SearchConfig(object):
         return new_value
 
 
+_lexer = None
+
+
+@lru_cache(maxsize=256)
+def compile_search_config(filter_spec: str) -> SearchConfig:
+    """Parse a filter spec; configs are cached by spec since they don't depend on the data."""
+    global _lexer
+    if _lexer is None:
+        _lexer = PadSearchLexer().build()
+    lexer = _lexer.clone()
+    lexer.input(filter_spec)
+    return SearchConfig(lexer)
+
+
 class PadSearch(commands.Cog):
     """PAD data searching."""
 
@@ -727,6 +816,17 @@ class PadSearch(commands.Cog):
         super().__init__(*args, **kwargs)
         self.bot = bot
 
+        # Rebuilt whenever Dadguide loads a new database
+        self.monster_table = None  # type: MonsterTable
+        self.searchable_mask = None
+
+        self.regex_runner = RegexRunner(timeout_secs=1)
+
+    def cog_unload(self):
+        self.monster_table = None
+        self.searchable_mask = None
+        self.regex_runner.close()
+
     async def red_get_data_for_user(self, *, user_id):
         """Get a user's personal data."""
         data = "No data is stored for user with ID {}.\n".format(user_id)
@@ -762,23 +862,14 @@ class PadSearch(commands.Cog):
         if dg_cog == None:
             await ctx.send("Dadguide cog not loaded.")
             return
-        monsters = dg_cog.database.get_all_monsters()
-
-        rmvGemFilter = self._make_search_config('remove( gem)')
-        monsters = list(filter(rmvGemFilter.check_filters, monsters))
-
-        matched_monsters = [m for m in monsters if config.check_filters(m)]
-        # Running regeces/globs on a timer
-        matched_monsters = await config.check_re_filters(matched_monsters, ctx)
-        matched_monsters = await config.check_glob_filters(matched_monsters, ctx)
-
-        # Removing entry with names that have gems in it
+        self._load_monster_table(dg_cog.database)
+        matched_monsters = await self._match_monsters(config, ctx)
 
         matched_monsters.sort(key=lambda m: m.monster_no_na, reverse=True)
 
         msg = 'Matched {} monsters'.format(len(matched_monsters))
         dm_required = False
-        if len(matched_monsters) == len(monsters):
+        if len(matched_monsters) == self.searchable_mask.sum():
             await ctx.send("All monsters were matched.  Try with a more specific query.")
             return
         if len(matched_monsters) > 10:
@@ -804,11 +895,51 @@ class PadSearch(commands.Cog):
         else:
             await ctx.send(box(msg))
 
+    def _load_monster_table(self, db_context: "DbContext"):
+        if self.monster_table is None or self.monster_table.database is not db_context:
+            self.monster_table = MonsterTable(db_context)
+            # Removing entry with names that have gems in it
+            rmv_gem_filter = self._make_search_config(REMOVE_GEMS_SPEC)
+            self.searchable_mask = self.monster_table.row_mask(rmv_gem_filter.check_filters)
+
+    async def _match_monsters(self, config: SearchConfig, ctx):
+        table = self.monster_table
+        candidates = table.select(self.searchable_mask & config.column_mask(table))
+        matched_monsters = [m for m in candidates if config.check_filters(m)]
+        # Globs run on a timer; regeces run in a worker process with a deadline
+        matched_monsters = await config.check_glob_filters(matched_monsters, ctx)
+        matched_monsters = await config.check_re_filters(matched_monsters, ctx, self.regex_runner)
+        return matched_monsters
+
     def _make_search_config(self, input):
-        lexer = PadSearchLexer().build()
-        lexer.input(input)
-        db_context = self.bot.get_cog("Dadguide").database
-        return SearchConfig(lexer, db_context)
+        return compile_search_config(input.strip())
+
+    @commands.command()
+    @checks.is_owner()
+    async def benchsearch(self, ctx):
+        """Times every documented filter against the current monster table."""
+        dg_cog = self.bot.get_cog('Dadguide')
+        if dg_cog == None:
+            await ctx.send("Dadguide cog not loaded.")
+            return
+        self._load_monster_table(dg_cog.database)
+
+        msg = '{:<36} {:>9} {:>9} {:>6}'.format('spec', 'parse ms', 'match ms', 'hits')
+        for spec in BENCHMARK_SPECS:
+            # Report a failing spec in its row rather than losing the whole table
+            try:
+                start = time.perf_counter()
+                config = compile_search_config.__wrapped__(spec)
+                parsed = time.perf_counter()
+                matched_monsters = await self._match_monsters(config, ctx)
+                matched = time.perf_counter()
+            except Exception as ex:
+                msg += '\n{:<36} failed: {}'.format(spec, ex)
+                continue
+            msg += '\n{:<36} {:>9.2f} {:>9.2f} {:>6}'.format(
+                spec, (parsed - start) * 1000, (matched - parsed) * 1000, len(matched_monsters))
+        for page in pagify(msg):
+            await ctx.send(box(page))
 
     @commands.command()
     @checks.is_owner()
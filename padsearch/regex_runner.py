@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import site
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger('red.padbot-cogs.padsearch.regex_runner')
+
+
+def regex_literals(pattern: str):
+    """Literal runs that every match of pattern contains, for prefiltering candidates.
+
+    Only runs of plain literals at the top level of the pattern are taken; anything inside
+    a group, branch or repeat ends the current run. Raises re.error for invalid patterns.
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & (re.IGNORECASE | re.VERBOSE):
+        return []
+    literals = []
+    current = ''
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            current += chr(arg)
+            continue
+        if current:
+            literals.append(current)
+        current = ''
+    if current:
+        literals.append(current)
+    return literals
+
+
+def _search_rows(patterns, rows):
+    # Runs in the worker process: patterns are (regex, column) pairs, rows are tuples of
+    # texts; returns the indexes of the rows every pattern matches
+    compiled = [(re.compile(p), col) for p, col in patterns]
+    return [idx for idx, row in enumerate(rows)
+            if all(r.search(row[col]) for r, col in compiled)]
+
+
+class RegexRunner(object):
+    """Runs user supplied regexes in a worker process with a hard deadline.
+
+    A pathological pattern can backtrack for an unbounded time while holding the GIL, which
+    a thread can't interrupt. Running the match in a separate process keeps the event loop
+    responsive; if the deadline passes the worker is killed and replaced on the next search.
+
+    The worker is spawned rather than forked, since forking the running bot can deadlock
+    the child, and gets the directory this cog was loaded from on its sys.path so it can
+    import it.
+    """
+
+    def __init__(self, timeout_secs: float = 1):
+        self.timeout_secs = timeout_secs
+        self._pool = None
+
+    @staticmethod
+    def _make_pool():
+        cogs_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # The initializer has to be importable before cogs_dir is on the path, so it's a
+        # stdlib function rather than one from this cog
+        return multiprocessing.get_context('spawn').Pool(
+            processes=1, initializer=site.addsitedir, initargs=(cogs_dir,))
+
+    async def _get_pool(self):
+        if self._pool is None:
+            # Starting a process blocks, so do it off the event loop
+            pool = await asyncio.get_running_loop().run_in_executor(None, self._make_pool)
+            if self._pool is None:
+                self._pool = pool
+            else:
+                # Another search started one meanwhile
+                pool.terminate()
+        return self._pool
+
+    async def search_rows(self, patterns, rows):
+        """Indexes of the rows matched by every pattern.
+
+        Raises TimeoutError if the worker doesn't finish within the deadline.
+        """
+        if not rows:
+            return []
+        pool = await self._get_pool()
+        result = pool.apply_async(_search_rows, (patterns, rows))
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, result.get, self.timeout_secs)
+        except multiprocessing.TimeoutError:
+            self._discard(pool)
+            await loop.run_in_executor(None, pool.terminate)
+            raise TimeoutError()
+
+    def _discard(self, pool):
+        # Only forget the pool if it's still current; a newer search may have replaced it
+        if self._pool is pool:
+            self._pool = None
+
+    def close(self):
+        pool = self._pool
+        if pool is not None:
+            self._discard(pool)
+            pool.terminate()
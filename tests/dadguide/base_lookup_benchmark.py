@@ -0,0 +1,67 @@
+import asyncio
+import random
+import statistics
+import time
+
+from dadguide.database_manager import DadguideDatabase
+from dadguide.database_context import DbContext
+from dadguide.monster_graph import MonsterGraph
+from dadguide.old_monster_index import MonsterIndex
+
+DB_FILE = 'S:\\Documents\\Games\\PAD\\dadguide.sqlite'
+QUERIES_PER_KIND = 200
+
+
+async def build_index(db_context):
+    return await MonsterIndex(db_context, {}, {}, {})
+
+
+def old_base_id_matches(index, query):
+    # The 'base <id>' stage before the direct map: format a candidate suffix per entry, then
+    # scan every entry for the base monster on a hit (find_first is next() over a generator)
+    matches = set()
+    for nickname, m in index.all_entries.items():
+        if query.endswith("base {}".format(m.monster_id)):
+            matches.add(next((mo for mo in index.all_entries.values()
+                              if m.base_monster_no == mo.monster_id), None))
+    return matches
+
+
+def time_matches(match, queries):
+    times = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(match(query))
+        times.append(time.perf_counter() - start)
+    percentiles = statistics.quantiles(times, n=100)
+    return percentiles[49] * 1000, percentiles[98] * 1000, results
+
+
+database = DadguideDatabase(DB_FILE)
+db_context = DbContext(database, MonsterGraph(database))
+index = asyncio.run(build_index(db_context))
+
+rng = random.Random(0)
+monster_ids = sorted({nm.monster_id for nm in index.all_entries.values()})
+max_id = max(monster_ids)
+query_kinds = [
+    ('hit', ['base {}'.format(i) for i in rng.sample(monster_ids, QUERIES_PER_KIND)]),
+    ('hit after name', ['tyrra base {}'.format(i) for i in rng.sample(monster_ids, QUERIES_PER_KIND)]),
+    ('unknown id', ['base {}'.format(max_id + i + 1) for i in range(QUERIES_PER_KIND)]),
+    ('leading zero', ['base 0{}'.format(i) for i in rng.sample(monster_ids, QUERIES_PER_KIND)]),
+]
+
+print('{:<15} {:>10} {:>10} {:>10} {:>10}'.format('kind', 'old p50', 'old p99', 'new p50', 'new p99'))
+for kind, queries in query_kinds:
+    old_p50, old_p99, old_results = time_matches(lambda q: old_base_id_matches(index, q), queries)
+    new_p50, new_p99, new_results = time_matches(index._base_id_match, queries)
+    for query, old, new in zip(queries, old_results, new_results):
+        if None in old:
+            # The old stage added None when the base monster had no nickname entry, and
+            # find_monster then crashed; the direct map falls through instead
+            assert new is None, query
+            continue
+        assert old == ({new} if new else set()), query
+    print('{:<15} {:>8.3f}ms {:>8.3f}ms {:>8.3f}ms {:>8.3f}ms'.format(
+        kind, old_p50, old_p99, new_p50, new_p99))
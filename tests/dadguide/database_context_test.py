@@ -12,6 +12,8 @@ assert db_context.graph.monster_is_farmable_by_id(4)
 assert not db_context.graph.monster_is_farmable_by_id(5156)
 assert db_context.graph.get_base_monster_by_id(1074).monster_id == 1073  # evo pandora
 assert 6352 in db_context.get_evolution_tree_ids(1074)
+assert db_context.graph.get_evo_tree(1074) == set(db_context.get_evolution_tree_ids(1073))
+assert db_context.graph.get_numerical_sort_top_id_by_id(1073) == max(db_context.graph.get_alt_cards(1074))
 assert db_context.get_monsters_by_series(1)[0].name_en == 'Tyrra'
 assert db_context.get_monsters_by_active(1)[0].name_en == 'Tyrra'
 
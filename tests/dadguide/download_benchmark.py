@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from dadguide.downloader import ConditionalDownloader
+
+# Stand-ins for the dump and the three override sheets, served with a fixed latency
+FILES = {
+    '/dadguide.sqlite': os.urandom(8 * 2 ** 20),
+    '/nicknames.csv': b'nick,1\n' * 2000,
+    '/basenames.csv': b'1,base\n' * 2000,
+    '/panthnames.csv': b'panth,name\n' * 200,
+}
+LATENCY_SECS = 0.25
+
+
+async def serve_file(request):
+    body = FILES[request.path]
+    etag = '"{}"'.format(hashlib.sha256(body).hexdigest())
+    await asyncio.sleep(LATENCY_SECS)
+    if request.headers.get('If-None-Match') == etag:
+        return web.Response(status=304, headers={'ETag': etag})
+    return web.Response(body=body, headers={'ETag': etag})
+
+
+async def sequential_plain(base_url, out_dir):
+    # How the files were fetched before: one at a time, always in full
+    for path in FILES:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(base_url + path) as resp:
+                data = await resp.read()
+        with open(os.path.join(out_dir, 'seq' + path.replace('/', '_')), 'wb') as f:
+            f.write(data)
+
+
+async def concurrent_conditional(downloader, base_url, out_dir):
+    async with aiohttp.ClientSession() as session:
+        return await asyncio.gather(*[
+            downloader.fetch(session, base_url + path, os.path.join(out_dir, path.lstrip('/')), 0)
+            for path in FILES])
+
+
+async def main():
+    app = web.Application()
+    app.router.add_get('/{name}', serve_file)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = 'http://127.0.0.1:{}'.format(port)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        downloader = ConditionalDownloader(os.path.join(out_dir, 'download_state.json'))
+
+        start = time.perf_counter()
+        await sequential_plain(base_url, out_dir)
+        print('sequential, unconditional: {:.2f}s'.format(time.perf_counter() - start))
+
+        start = time.perf_counter()
+        downloaded = await concurrent_conditional(downloader, base_url, out_dir)
+        print('concurrent, first fetch: {:.2f}s, downloaded {}'.format(
+            time.perf_counter() - start, downloaded))
+        assert all(downloaded)
+        for path, body in FILES.items():
+            with open(os.path.join(out_dir, path.lstrip('/')), 'rb') as f:
+                assert f.read() == body
+
+        start = time.perf_counter()
+        downloaded = await concurrent_conditional(downloader, base_url, out_dir)
+        print('concurrent, unchanged: {:.2f}s, downloaded {}'.format(
+            time.perf_counter() - start, downloaded))
+        assert not any(downloaded)
+
+    await runner.cleanup()
+
+
+asyncio.run(main())
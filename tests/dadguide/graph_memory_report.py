@@ -0,0 +1,18 @@
+import tracemalloc
+
+from dadguide.database_manager import DadguideDatabase
+from dadguide.monster_graph import MonsterGraph
+
+database = DadguideDatabase('S:\\Documents\\Games\\PAD\\dadguide.sqlite')
+
+tracemalloc.start()
+before = tracemalloc.take_snapshot()
+graph = MonsterGraph(database)
+after = tracemalloc.take_snapshot()
+current, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+print('MonsterGraph for {} monsters: {:.1f} MiB retained, {:.1f} MiB peak'.format(
+    len(graph._monsters), current / 2 ** 20, peak / 2 ** 20))
+for stat in after.compare_to(before, 'lineno')[:15]:
+    print(stat)
@@ -0,0 +1,85 @@
+import asyncio
+import random
+import statistics
+import time
+
+from dadguide.database_manager import DadguideDatabase
+from dadguide.database_context import DbContext
+from dadguide.monster_graph import MonsterGraph
+from dadguide.old_monster_index import MonsterIndex
+
+DB_FILE = 'S:\\Documents\\Games\\PAD\\dadguide.sqlite'
+QUERIES_PER_KIND = 300
+
+
+class ScanIndex(object):
+    # The contains stages before NgramIndex: walk every entry, lowercasing as it goes
+    def __init__(self, items):
+        self._items = list(items)
+
+    def values_containing(self, substring):
+        for text, value in self._items:
+            if substring in text.lower():
+                yield value
+
+    def values_containing_all(self, substrings):
+        for text, value in self._items:
+            if all(s in text.lower() for s in substrings):
+                yield value
+
+
+async def build_index(db_context):
+    return await MonsterIndex(db_context, {}, {}, {})
+
+
+def scan_index_copy(index):
+    # The same index, with its contains stages answered by scanning all_entries again
+    old = object.__new__(MonsterIndex)
+    old.__dict__.update(index.__dict__)
+    old.nickname_ngram_index = ScanIndex(index.all_entries.items())
+    old.name_ngram_index = ScanIndex(
+        [(nm.name_en, nm) for nm in index.all_entries.values()]
+        + [(nm.name_ja, nm) for nm in index.all_entries.values()])
+    return old
+
+
+def make_queries(index):
+    rng = random.Random(0)
+    names = sorted({nm.name_en.lower() for nm in index.all_entries.values() if len(nm.name_en) >= 8})
+    multi_word = [n for n in names if len(n.split()) >= 2]
+
+    misses = [''.join(rng.choice('qxzjvk') for _ in range(rng.randint(6, 12)))
+              for _ in range(QUERIES_PER_KIND)]
+    # The inside of a word, so the query isn't a nickname or name prefix
+    words = sorted({w for n in names for w in n.split() if len(w) >= 7})
+    contains = [w[1:-1] for w in rng.sample(words, QUERIES_PER_KIND)]
+    all_words = [' '.join(reversed(n.split())) for n in rng.sample(multi_word, QUERIES_PER_KIND)]
+    return [('miss', misses), ('name contains', contains), ('all words', all_words)]
+
+
+def time_lookups(find, queries):
+    times = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        nm, _, _ = find(query)
+        times.append(time.perf_counter() - start)
+        results.append(nm.monster_id if nm else None)
+    percentiles = statistics.quantiles(times, n=100)
+    return percentiles[49] * 1000, percentiles[98] * 1000, results
+
+
+database = DadguideDatabase(DB_FILE)
+db_context = DbContext(database, MonsterGraph(database))
+new_index = asyncio.run(build_index(db_context))
+old_index = scan_index_copy(new_index)
+
+print('{:<15} {:<13} {:>10} {:>10} {:>10} {:>10}'.format(
+    'kind', 'method', 'old p50', 'old p99', 'new p50', 'new p99'))
+for kind, queries in make_queries(new_index):
+    for method in ('find_monster', 'find_monster2'):
+        old_p50, old_p99, old_results = time_lookups(getattr(old_index, method), queries)
+        new_p50, new_p99, new_results = time_lookups(getattr(new_index, method), queries)
+        assert old_results == new_results, (kind, method)
+        print('{:<15} {:<13} {:>8.2f}ms {:>8.2f}ms {:>8.2f}ms {:>8.2f}ms'.format(
+            kind, method, old_p50, old_p99, new_p50, new_p99))
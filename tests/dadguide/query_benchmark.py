@@ -0,0 +1,34 @@
+import sqlite3
+import timeit
+
+from dadguide.database_manager import DadguideDatabase
+from dadguide.monster_graph import MONSTER_QUERY, AWAKENINGS_QUERY
+
+DB_FILE = 'S:\\Documents\\Games\\PAD\\dadguide.sqlite'
+RUNS = 5
+
+
+class OldDictWithAttrAccess(dict):
+    # The row wrapper query_many used before rows were built straight from tuples
+    def __init__(self, item):
+        super(OldDictWithAttrAccess, self).__init__(item)
+        self.__dict__ = self
+
+
+old_con = sqlite3.connect(DB_FILE, detect_types=sqlite3.PARSE_DECLTYPES)
+old_con.row_factory = sqlite3.Row
+
+
+def old_query_many(query):
+    return [OldDictWithAttrAccess(res) for res in old_con.execute(query).fetchall()]
+
+
+database = DadguideDatabase(DB_FILE)
+
+for name, query in (('MONSTER_QUERY', MONSTER_QUERY), ('AWAKENINGS_QUERY', AWAKENINGS_QUERY)):
+    old = min(timeit.repeat(lambda: old_query_many(query), number=1, repeat=RUNS))
+    new = min(timeit.repeat(lambda: database.query_many(query, ()), number=1, repeat=RUNS))
+    streamed = min(timeit.repeat(lambda: sum(1 for _ in database.query_many(query, (), as_generator=True)),
+                                 number=1, repeat=RUNS))
+    print('{}: sqlite3.Row + dict wrapper {:.1f} ms, tuple rows {:.1f} ms, streamed {:.1f} ms'.format(
+        name, old * 1000, new * 1000, streamed * 1000))